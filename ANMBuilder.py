@@ -1,7 +1,9 @@
-from PIL import Image # 9.4.0-2
 import struct
 from enum import Enum
 
+import FileOutput
+import Profiling
+
 def addColor( endian, b, g, r ):
     r_bit = min( int( r * 32.0 ), 31 )
     g_bit = min( int( g * 32.0 ), 31 )
@@ -22,6 +24,37 @@ def makeHeader( endian, number_of_frames, given_palette ):
 
     return data;
 
+# PLUT index 0 is the unseen color, so palette index i is stored as i + 1. makeHeader writes 255 palette colors,
+# writeSingleFrameMapped never lets an index past 254 through, so index 255 never needs a place.
+SHIFT_INDEX = bytes( (i + 1) & 0xFF for i in range( 0, 0x100 ) )
+
+# Same frame layout as writeSingleFrame, but every pixel is looked up in a PaletteMapper built for the palette.
+# The cube is built once and reused for all frames, mapper has no error diffusion so the indexes differ from quantize.
+def writeSingleFrameMapped( colorful_image, mapper, dither : bool = False ):
+    from PIL import Image # 9.4.0-2
+
+    if mapper.color_amount > 0xFF:
+        raise Exception( "The mapper has {} colors but an ANM palette holds {}".format( mapper.color_amount, 0xFF ) )
+
+    img = Image.frombytes( "L", colorful_image.size, mapper.mapImage( colorful_image, dither ).translate( SHIFT_INDEX ) )
+
+    if colorful_image.mode in ('RGBA', 'LA'):
+        img.paste( 0, mask = colorful_image.split()[-1].point( lambda a: 255 if a == 0 else 0 ) )
+
+    indexes = img.tobytes()
+    width = colorful_image.width
+
+    pixel_data = bytearray()
+    SCAN_LINES_PER_FRAME = 4
+    SCAN_LINE_POSITIONS = int(48 / SCAN_LINES_PER_FRAME)
+
+    for s in range(0, SCAN_LINE_POSITIONS):
+        for next_y in range(0, SCAN_LINES_PER_FRAME):
+            start = (SCAN_LINE_POSITIONS * next_y + s) * width
+            pixel_data += indexes[ start:start + 64 ]
+
+    return pixel_data
+
 def writeSingleFrame( colorful_image, quant_img ):
     img = colorful_image.convert('RGB').quantize( palette = quant_img )
     alpha = None
@@ -50,9 +83,20 @@ class Platform( Enum ):
     Windows = 1
     Macintosh = 2
 
-def writeANMFile( reference_image_path : str, reference_color_palette : str, output_fnt_path : str, kind : Platform, frame_count : int = 30 ):
-    source_palette_img = Image.open( reference_color_palette )
-    quant_img = source_palette_img.quantize( colors = 255 )
+def loadPalette( reference_color_palette : str ):
+    from PIL import Image # 9.4.0-2
+
+    with Profiling.span( "anm.palette" ):
+        source_palette_img = Image.open( reference_color_palette )
+        return source_palette_img.quantize( colors = 255 )
+
+# quant_img can be given to reuse the result of loadPalette for reference_color_palette.
+# mapper is a PaletteMapper.PaletteMapper for that palette, when given the frames go through writeSingleFrameMapped.
+def makeANMResource( reference_image_path : str, reference_color_palette : str, kind : Platform, frame_count : int = 30, quant_img = None, mapper = None, dither : bool = False ):
+    from PIL import Image # 9.4.0-2
+
+    if quant_img is None:
+        quant_img = loadPalette( reference_color_palette )
 
     palette = quant_img.getpalette()
 
@@ -67,10 +111,23 @@ def writeANMFile( reference_image_path : str, reference_color_palette : str, out
 
     data = makeHeader( endian = status_endian, number_of_frames = frame_count, given_palette = palette)
 
-    for i in range(1, 31):
+    for i in range(1, frame_count + 1):
         p = reference_image_path + "/{:04d}.png".format( i )
-        colorful_image = Image.open( p )
-        data += writeSingleFrame( colorful_image, quant_img )
 
-    new_file = open( output_fnt_path, "wb" )
-    new_file.write( data )
+        with Profiling.span( "anm.decode" ):
+            colorful_image = Image.open( p )
+            colorful_image.load()
+
+        if mapper is not None:
+            data += Profiling.measure( "anm.writeSingleFrame", writeSingleFrameMapped, colorful_image, mapper, dither )
+        else:
+            data += Profiling.measure( "anm.writeSingleFrame", writeSingleFrame, colorful_image, quant_img )
+
+    return data
+
+def writeANMFile( reference_image_path : str, reference_color_palette : str, output_fnt_path : str, kind : Platform, frame_count : int = 30, quant_img = None, mapper = None, dither : bool = False ):
+    data = makeANMResource( reference_image_path, reference_color_palette, kind, frame_count, quant_img, mapper, dither )
+
+    with Profiling.span( "anm.write" ) as span:
+        FileOutput.writeFileAtomic( output_fnt_path, data )
+        span.addBytes( len( data ) )
@@ -0,0 +1,94 @@
+import struct
+
+import Profiling
+
+# Reads ANM resources made by ANMBuilder back into palette images, one frame at a time.
+# A frame is never decoded before it is asked for, and then its 48 scanlines are put back in order
+# with 48 slice copies instead of a loop over the pixels.
+
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 48
+FRAME_SIZE = FRAME_WIDTH * FRAME_HEIGHT
+PALETTE_OFFSET = 4
+FRAMES_OFFSET = PALETTE_OFFSET + 0x100 * 2
+
+SCAN_LINES_PER_FRAME = 4
+SCAN_LINE_POSITIONS = int( FRAME_HEIGHT / SCAN_LINES_PER_FRAME )
+
+# writeSingleFrame stores the scanlines s, s + 12, s + 24 and s + 36 together for every s.
+# The scanline at row y of a frame is stored as scanline STORED_ROW[y].
+STORED_ROW = [0] * FRAME_HEIGHT
+
+for s in range( 0, SCAN_LINE_POSITIONS ):
+    for next_y in range( 0, SCAN_LINES_PER_FRAME ):
+        STORED_ROW[ SCAN_LINE_POSITIONS * next_y + s ] = s * SCAN_LINES_PER_FRAME + next_y
+
+class ANMResource:
+    def __init__(self, data, endian : str, frame_amount : int):
+        self.data = memoryview( data )
+        self.endian = endian
+        self.frame_amount = frame_amount
+        self.palette = None
+
+    def getFrameAmount( self ):
+        return self.frame_amount
+
+    def __len__( self ):
+        return self.frame_amount
+
+    # Returns the 256 PLUT colors as a flat RGB list, color 0 is the unseen color of clear pixels.
+    def getPalette( self ):
+        if self.palette is None:
+            from PIL import Image # 9.4.0-2
+
+            words = bytes( self.data[ PALETTE_OFFSET:FRAMES_OFFSET ] )
+
+            if self.endian == '>':
+                swapped = bytearray( len( words ) )
+                swapped[0::2] = words[1::2]
+                swapped[1::2] = words[0::2]
+                words = bytes( swapped )
+
+            # addColor keeps red in the high bits.
+            self.palette = list( Image.frombytes( "RGB", (0x100, 1), words, "raw", "BGR;15" ).tobytes() )
+
+        return self.palette
+
+    # Returns the PLUT indexes of a frame in row order.
+    def getFrameIndexes( self, index : int ):
+        if index < 0 or index >= self.frame_amount:
+            raise Exception( "Frame {} is not one of the {} frames".format( index, self.frame_amount ) )
+
+        start = FRAMES_OFFSET + index * FRAME_SIZE
+        frame = self.data[ start:start + FRAME_SIZE ]
+
+        return b"".join( frame[ row * FRAME_WIDTH:(row + 1) * FRAME_WIDTH ] for row in STORED_ROW )
+
+    # Returns a frame as a P image with the palette of the resource, index 0 is transparent.
+    def getFrame( self, index : int ):
+        from PIL import Image # 9.4.0-2
+
+        with Profiling.span( "anm.readFrame" ):
+            image = Image.frombytes( "P", (FRAME_WIDTH, FRAME_HEIGHT), self.getFrameIndexes( index ) )
+            image.putpalette( self.getPalette() )
+            image.info[ "transparency" ] = 0
+
+        return image
+
+    def __iter__( self ):
+        for index in range( 0, self.frame_amount ):
+            yield self.getFrame( index )
+
+# Both byte orders are tried for the frame amount, only one of them fits the size of the resource.
+def readANMResource( data ):
+    for endian in ('<', '>'):
+        frame_amount = struct.unpack_from( "{}I".format( endian ), data, 0 )[0]
+
+        if FRAMES_OFFSET + frame_amount * FRAME_SIZE == len( data ):
+            return ANMResource( data, endian, frame_amount )
+
+    raise Exception( "{} bytes is not the size of an ANM resource".format( len( data ) ) )
+
+def readANMFile( anm_path : str ):
+    with open( anm_path, "rb" ) as anm_file:
+        return readANMResource( anm_file.read() )
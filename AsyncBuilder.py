@@ -0,0 +1,54 @@
+import asyncio
+import functools
+
+import FileOutput
+
+# asyncio versions of the builders.
+# The encoding runs on executor, which should be a concurrent.futures.ProcessPoolExecutor for
+# CPU bound batches since the encoders hold the GIL. None uses the default thread pool of the loop.
+# The output is written atomically on the default thread pool so the event loop never blocks on disk.
+
+async def runInExecutor( executor, function, *arguments, **keywords ):
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor( executor, functools.partial( function, *arguments, **keywords ) )
+
+async def writeFileAtomicAsync( path : str, data ):
+    await runInExecutor( None, FileOutput.writeFileAtomic, path, data )
+
+async def writeCBMPFileAsync( source_img, output_fnt_path : str, kind, executor = None ):
+    import CBMPBuilder
+
+    data = await runInExecutor( executor, CBMPBuilder.makeCBMPResource, source_img, kind )
+    await writeFileAtomicAsync( output_fnt_path, data )
+
+def makeCBMPResourcePath( reference_image_path : str, kind ):
+    import CBMPBuilder
+
+    return CBMPBuilder.makeCBMPResource( CBMPBuilder.loadImage( reference_image_path ), kind )
+
+async def writeCBMPFilePathAsync( reference_image_path : str, output_fnt_path : str, kind, executor = None ):
+    # Decoding happens on the executor too, so only the path crosses a process boundary.
+    data = await runInExecutor( executor, makeCBMPResourcePath, reference_image_path, kind )
+    await writeFileAtomicAsync( output_fnt_path, data )
+
+async def writeANMFileAsync( reference_image_path : str, reference_color_palette : str, output_fnt_path : str, kind, frame_count : int = 30, executor = None ):
+    import ANMBuilder
+
+    data = await runInExecutor( executor, ANMBuilder.makeANMResource, reference_image_path, reference_color_palette, kind, frame_count )
+    await writeFileAtomicAsync( output_fnt_path, data )
+
+async def writeFNTFilesAsync( reference_image_path : str, output_fnt_paths : {}, font : {}, executor = None ):
+    import PFNTBuilder
+
+    encoding = await runInExecutor( executor, PFNTBuilder.encodeFont, reference_image_path, font )
+
+    await asyncio.gather( *[ writeFileAtomicAsync( output_fnt_paths[ kind ], encoding.make( kind ) ) for kind in output_fnt_paths ] )
+
+async def writeFNTFileAsync( reference_image_path : str, output_fnt_path : str, font : {}, kind, executor = None ):
+    await writeFNTFilesAsync( reference_image_path, { kind: output_fnt_path }, font, executor )
+
+# export_options are the keyword arguments of Model.makeResource, like deduplicate_buffers.
+async def makeFileAsync( model, filepath : str, model_format, executor = None, **export_options ):
+    data = await runInExecutor( executor, model.makeResource, model_format, **export_options )
+    await writeFileAtomicAsync( filepath, data )
@@ -0,0 +1,177 @@
+import json
+
+import CBMPBuilder
+import Profiling
+
+# Packs many small sprites into as few 256x256 CBMP pages as possible.
+# Every page is filled with a skyline bottom-left packer and the sprites are tried from the tallest down,
+# a sprite goes onto the first page that has room for it and a new page is only started when none has.
+
+PAGE_SIZE = 256
+
+class AtlasSprite:
+    def __init__(self, name : str, page_index : int, bmp_id : int, x : int, y : int, width : int, height : int):
+        self.name = name
+        self.page_index = page_index
+        self.bmp_id = bmp_id
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    # The corners go clockwise from the top left, the same order FaceType.setTexCoords takes for a quad.
+    def getTexCoords(self):
+        right = self.x + self.width - 1
+        bottom = self.y + self.height - 1
+
+        return ((self.x, self.y), (right, self.y), (right, bottom), (self.x, bottom))
+
+    def getBMPID(self):
+        return self.bmp_id
+
+    def applyTo(self, face_type):
+        face_type.setTexCoords( True, self.getTexCoords() )
+        face_type.setBMPID( self.bmp_id )
+
+    def toDictionary(self):
+        return {
+            "page": self.page_index,
+            "bmp_id": self.bmp_id,
+            "x": self.x,
+            "y": self.y,
+            "width": self.width,
+            "height": self.height,
+            "tex_coords": self.getTexCoords() }
+
+class SkylinePage:
+    def __init__(self):
+        # Every segment is [x, y, width] and together they cover the width of the page.
+        self.skyline = [ [0, 0, PAGE_SIZE] ]
+
+    def findPosition(self, width : int, height : int):
+        best = None
+
+        for index in range( 0, len( self.skyline ) ):
+            x = self.skyline[ index ][0]
+
+            if x + width > PAGE_SIZE:
+                break
+
+            # The sprite rests on the highest segment underneath it.
+            y = 0
+            covered = 0
+            next_index = index
+
+            while covered < width:
+                y = max( y, self.skyline[ next_index ][1] )
+                covered += self.skyline[ next_index ][2]
+                next_index += 1
+
+            if y + height > PAGE_SIZE:
+                continue
+
+            if best is None or (y + height, x) < (best[1] + height, best[0]):
+                best = (x, y, index)
+
+        return best
+
+    def place(self, width : int, height : int, position : tuple):
+        x, y, index = position
+
+        new_segment = [ x, y + height, width ]
+        right = x + width
+
+        # Cut away everything the new segment now covers.
+        end_index = index
+
+        while end_index < len( self.skyline ) and self.skyline[ end_index ][0] < right:
+            end_index += 1
+
+        last = self.skyline[ end_index - 1 ]
+        remainder = None
+
+        if last[0] + last[2] > right:
+            remainder = [ right, last[1], last[0] + last[2] - right ]
+
+        replacement = [ new_segment ]
+
+        if remainder is not None:
+            replacement.append( remainder )
+
+        self.skyline[ index:end_index ] = replacement
+
+        # Join the neighbours that ended up at the same height.
+        merged = [ self.skyline[0] ]
+
+        for segment in self.skyline[ 1: ]:
+            if segment[1] == merged[-1][1]:
+                merged[-1][2] += segment[2]
+            else:
+                merged.append( segment )
+
+        self.skyline = merged
+
+# sprites is a list of (name, PIL image) pairs.
+# Returns the page images and a dictionary of every sprite name to its AtlasSprite.
+# padding keeps that many clear pixels right and below every sprite so filtering does not bleed.
+def packSprites( sprites : [], bmp_id_start : int = 0, padding : int = 0 ):
+    from PIL import Image # 9.4.0-2
+
+    names = set()
+
+    for name, image in sprites:
+        if name in names:
+            raise Exception( "Sprite name '{}' is used more than once".format( name ) )
+
+        names.add( name )
+
+        if image.width + padding > PAGE_SIZE or image.height + padding > PAGE_SIZE:
+            raise Exception( "Sprite '{}' is {}x{} with {} padding which does not fit a {}x{} page".format( name, image.width, image.height, padding, PAGE_SIZE, PAGE_SIZE ) )
+
+    order = sorted( range( 0, len( sprites ) ), key = lambda i: (sprites[i][1].height, sprites[i][1].width), reverse = True )
+
+    pages = []
+    page_images = []
+    table = {}
+
+    with Profiling.span( "atlas.pack" ):
+        for i in order:
+            name, image = sprites[i]
+
+            width = image.width + padding
+            height = image.height + padding
+
+            position = None
+            page_index = 0
+
+            for page_index in range( 0, len( pages ) ):
+                position = pages[ page_index ].findPosition( width, height )
+
+                if position is not None:
+                    break
+
+            if position is None:
+                pages.append( SkylinePage() )
+                page_images.append( Image.new( "RGBA", (PAGE_SIZE, PAGE_SIZE), (0, 0, 0, 0) ) )
+                page_index = len( pages ) - 1
+                position = pages[ page_index ].findPosition( width, height )
+
+            pages[ page_index ].place( width, height, position )
+            page_images[ page_index ].paste( image.convert( "RGBA" ), (position[0], position[1]) )
+
+            table[ name ] = AtlasSprite( name, page_index, bmp_id_start + page_index, position[0], position[1], image.width, image.height )
+
+    return (page_images, table)
+
+# output_path_format is formatted with the page index, for example "textures/atlas_{}.cbmp".
+def writeAtlas( sprites : [], output_path_format : str, kind : CBMPBuilder.Platform, bmp_id_start : int = 0, padding : int = 0 ):
+    page_images, table = packSprites( sprites, bmp_id_start, padding )
+
+    for page_index in range( 0, len( page_images ) ):
+        CBMPBuilder.writeCBMPFile( page_images[ page_index ], output_path_format.format( page_index ), kind )
+
+    return table
+
+def writeUVTable( table : {}, path : str ):
+    with open( path, "w" ) as json_file:
+        json.dump( { name: table[ name ].toDictionary() for name in table }, json_file, indent = 4 )
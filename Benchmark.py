@@ -0,0 +1,258 @@
+from PIL import Image # 9.4.0-2
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import ANMBuilder
+import CBMPBuilder
+import COBJBuilder
+import PFNTBuilder
+import Profiling
+
+# Every input is generated from the seed, so two runs with the same arguments time the same work.
+
+def makeAlphaTable():
+    # A quarter clear, half opaque and the rest semi-transparent.
+    table = bytearray( range( 0, 0x100 ) )
+
+    for i in range( 0, 0x40 ):
+        table[i] = 0
+
+    for i in range( 0x40, 0xC0 ):
+        table[i] = 255
+
+    return bytes( table )
+
+ALPHA_TABLE = makeAlphaTable()
+
+def makeTexture( rng : random.Random, width : int = 256, height : int = 256 ):
+    rgb = Image.frombytes( "RGB", (width, height), rng.randbytes( width * height * 3 ) )
+    alpha = Image.frombytes( "L", (width, height), rng.randbytes( width * height ).translate( ALPHA_TABLE ) )
+
+    rgb.putalpha( alpha )
+
+    return rgb
+
+def makeFontAtlas( rng : random.Random, height : int = 64 ):
+    atlas = Image.frombytes( "L", (256, height), bytes( rng.choice( (0, 255) ) for i in range( 0, 256 * height ) ) )
+
+    font = {}
+
+    for code in range( 0x20, 0x7F ):
+        font[ code ] = PFNTBuilder.Font( rng.randint( 4, 12 ), rng.randint( 8, 14 ), rng.randint( 0, 240 ), rng.randint( 0, height - 16 ), rng.randint( 4, 12 ), rng.randint( -2, 2 ), rng.randint( -2, 2 ) )
+
+    return (atlas, font)
+
+def makeModel( rng : random.Random, vertex_amount : int, primitive_amount : int, frame_amount : int, face_type_amount : int = 8 ):
+    model = COBJBuilder.Model()
+
+    for i in range( 0, face_type_amount ):
+        face_type = COBJBuilder.FaceType()
+
+        if i % 2 == 0:
+            face_type.setTexCoords( True, ((0, 0), (rng.randint( 0, 255 ), 0), (0, rng.randint( 0, 255 )), (rng.randint( 0, 255 ), rng.randint( 0, 255 ))) )
+            face_type.setBMPID( rng.randint( 0, 15 ) )
+        else:
+            face_type.setVertexColor( True, (rng.randint( 0, 255 ), rng.randint( 0, 255 ), rng.randint( 0, 255 )) )
+
+        model.appendFaceType( face_type )
+
+    for i in range( 0, primitive_amount ):
+        primitive = COBJBuilder.Primitive()
+
+        if i % 2 == 0:
+            primitive.setTypeTriangle( rng.sample( range( 0, vertex_amount ), 3 ), rng.sample( range( 0, vertex_amount ), 3 ) )
+        else:
+            primitive.setTypeQuad( rng.sample( range( 0, vertex_amount ), 4 ), rng.sample( range( 0, vertex_amount ), 4 ) )
+
+        primitive.setFaceTypeIndex( rng.randint( 0, face_type_amount - 1 ) )
+        primitive.setTexture( model.getFaceType( primitive.getFaceTypeIndex() ).hasTexCoords() )
+
+        model.appendPrimitive( primitive )
+
+    model.allocateVertexBuffers( frame_amount, vertex_amount, vertex_amount, 0, 0, 0 )
+
+    for f in range( 0, frame_amount ):
+        positions = model.getPositionBuffer( f )
+        normals = model.getNormalBuffer( f )
+
+        for i in range( 0, vertex_amount ):
+            positions.setValue( i, (rng.randint( -2048, 2047 ), rng.randint( -2048, 2047 ), rng.randint( -2048, 2047 )) )
+            normals.setValue( i, (rng.randint( -4096, 4096 ), rng.randint( -4096, 4096 ), rng.randint( -4096, 4096 )) )
+
+    return model
+
+class BenchmarkCase:
+    # run() does the timed work and returns the amount of output bytes it produced.
+    def __init__(self, name : str, asset_amount : int, run):
+        self.name = name
+        self.asset_amount = asset_amount
+        self.run = run
+
+    def measure(self, repeat : int):
+        timings = []
+        output_size = 0
+
+        for i in range( 0, repeat ):
+            start = time.perf_counter()
+            output_size = self.run()
+            timings.append( time.perf_counter() - start )
+
+        tracemalloc.start()
+        self.run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        best = min( timings )
+
+        return {
+            "name": self.name,
+            "repeat": repeat,
+            "assets": self.asset_amount,
+            "output_bytes": output_size,
+            "best_seconds": best,
+            "mean_seconds": sum( timings ) / len( timings ),
+            "assets_per_second": self.asset_amount / best,
+            "megabytes_per_second": output_size / best / (1024 * 1024),
+            "peak_memory_bytes": peak_memory }
+
+def fileSizes( paths : [] ):
+    size = 0
+
+    for path in paths:
+        size += os.path.getsize( path )
+
+    return size
+
+def makeCases( arguments, directory : str ):
+    rng = random.Random( arguments.seed )
+    cases = []
+
+    textures = [ makeTexture( rng ) for i in range( 0, arguments.textures ) ]
+
+    for kind in CBMPBuilder.Platform:
+        paths = [ os.path.join( directory, "texture_{}_{}.cbmp".format( kind.name, i ) ) for i in range( 0, len( textures ) ) ]
+
+        def run( kind = kind, paths = paths ):
+            for i in range( 0, len( textures ) ):
+                CBMPBuilder.writeCBMPFile( textures[i], paths[i], kind )
+            return fileSizes( paths )
+
+        cases.append( BenchmarkCase( "writeCBMPFile[{}]".format( kind.name ), len( textures ), run ) )
+
+    frame_directory = os.path.join( directory, "anm_frames" )
+    os.mkdir( frame_directory )
+
+    for i in range( 1, 31 ):
+        makeTexture( rng, 64, 48 ).save( os.path.join( frame_directory, "{:04d}.png".format( i ) ) )
+
+    palette_path = os.path.join( directory, "anm_palette.png" )
+    makeTexture( rng, 64, 48 ).convert( "RGB" ).save( palette_path )
+
+    for kind in ANMBuilder.Platform:
+        path = os.path.join( directory, "video_{}.anm".format( kind.name ) )
+
+        def run( kind = kind, path = path ):
+            ANMBuilder.writeANMFile( frame_directory, palette_path, path, kind )
+            return fileSizes( [ path ] )
+
+        cases.append( BenchmarkCase( "writeANMFile[{}]".format( kind.name ), 1, run ) )
+
+    atlas, font = makeFontAtlas( rng )
+    atlas_path = os.path.join( directory, "font_atlas.png" )
+    atlas.save( atlas_path )
+
+    for kind in PFNTBuilder.Platform:
+        path = os.path.join( directory, "font_{}.fnt".format( kind.name ) )
+
+        def run( kind = kind, path = path ):
+            PFNTBuilder.writeFNTFile( atlas_path, path, font, kind )
+            return fileSizes( [ path ] )
+
+        cases.append( BenchmarkCase( "writeFNTFile[{}]".format( kind.name ), 1, run ) )
+
+    models = [ makeModel( rng, arguments.vertices, arguments.primitives, arguments.frames ) for i in range( 0, arguments.models ) ]
+
+    # ModelFormat.PLAYSTATION is an alias of WINDOWS so only the distinct formats are timed.
+    for model_format in COBJBuilder.ModelFormat:
+        def run( model_format = model_format ):
+            size = 0
+            for model in models:
+                size += len( model.makeResource( model_format ) )
+            return size
+
+        cases.append( BenchmarkCase( "Model.makeResource[{}]".format( model_format.name ), len( models ), run ) )
+
+    return cases
+
+def getRevision():
+    try:
+        return subprocess.run( [ "git", "rev-parse", "HEAD" ], cwd = os.path.dirname( os.path.abspath( __file__ ) ), capture_output = True, text = True, check = True ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runBenchmarks( arguments ):
+    import PIL
+
+    results = {
+        "revision": getRevision(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "machine": platform.machine(),
+        "settings": vars( arguments ).copy(),
+        "cases": [] }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for case in makeCases( arguments, directory ):
+            if arguments.filter is not None and arguments.filter not in case.name:
+                continue
+
+            result = case.measure( arguments.repeat )
+            results["cases"].append( result )
+
+            print( "{:32} {:9.4f} s {:10.2f} assets/s {:8.3f} MB/s {:8.2f} MiB peak".format( result["name"], result["best_seconds"], result["assets_per_second"], result["megabytes_per_second"], result["peak_memory_bytes"] / (1024 * 1024) ) )
+
+    return results
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "Time the builders on synthetic inputs." )
+    parser.add_argument( "--output", help = "write the results as JSON to this path" )
+    parser.add_argument( "--profile", help = "record the time of every builder stage, print a summary and write it as JSON to this path" )
+    parser.add_argument( "--filter", help = "only run the cases whose name contains this text" )
+    parser.add_argument( "--seed", type = int, default = 1998 )
+    parser.add_argument( "--repeat", type = int, default = 3 )
+    parser.add_argument( "--textures", type = int, default = 4 )
+    parser.add_argument( "--models", type = int, default = 4 )
+    parser.add_argument( "--vertices", type = int, default = 200 )
+    parser.add_argument( "--primitives", type = int, default = 300 )
+    parser.add_argument( "--frames", type = int, default = 10 )
+    arguments = parser.parse_args( argv )
+
+    if arguments.vertices > 0x100 or arguments.vertices < 4:
+        parser.error( "--vertices has to be from 4 to {}".format( 0x100 ) )
+
+    sink = None
+
+    if arguments.profile is not None:
+        sink = Profiling.RecordingSink()
+        Profiling.setSink( sink )
+
+    results = runBenchmarks( arguments )
+
+    if sink is not None:
+        Profiling.setSink( None )
+        print( sink.summary() )
+        sink.writeJSON( arguments.profile )
+
+    if arguments.output is not None:
+        with open( arguments.output, "w" ) as output_file:
+            json.dump( results, output_file, indent = 4 )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import argparse
+import collections
+import importlib
+import json
+import os
+import sys
+
+# One command line front end for the builders.
+# The builder modules are only imported by the command that needs them, and they import PIL on first use,
+# so a cobj conversion never loads PIL and "serve" pays the start up cost once for every job it reads.
+
+PLATFORM_NAMES = {
+    "playstation": 0, "ps1": 0,
+    "windows": 1, "win": 1,
+    "macintosh": 2, "mac": 2 }
+
+MODEL_FORMAT_NAMES = {
+    "playstation": "PLAYSTATION", "ps1": "PLAYSTATION",
+    "windows": "WINDOWS", "win": "WINDOWS",
+    "macintosh": "MAC", "mac": "MAC" }
+
+# The switches of a cobj job that go straight to Model.makeFile.
+EXPORT_OPTIONS = ("deduplicate_buffers", "deduplicate_face_types", "sort_primitives")
+
+# A cobj model ending in one of these is a mesh file for MeshImporter instead of module:function.
+MESH_EXTENSIONS = (".obj", ".gltf", ".glb")
+
+# Keeps decoded inputs between jobs. An entry is found again only while the file keeps its
+# modification time and size, so an edited source is always read again.
+class JobCache:
+    def __init__(self, capacity : int = 64):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+
+    def get(self, kind : str, path : str, load):
+        status = os.stat( path )
+        key = (kind, os.path.abspath( path ), status.st_mtime_ns, status.st_size)
+
+        if key in self.entries:
+            self.entries.move_to_end( key )
+            return self.entries[ key ]
+
+        value = load( path )
+
+        self.entries[ key ] = value
+
+        if len( self.entries ) > self.capacity:
+            self.entries.popitem( last = False )
+
+        return value
+
+def getPlatform( module, name : str ):
+    if name.lower() not in PLATFORM_NAMES:
+        raise Exception( "Unknown platform '{}'. Use one of {}".format( name, ", ".join( PLATFORM_NAMES ) ) )
+
+    return module.Platform( PLATFORM_NAMES[ name.lower() ] )
+
+def loadModel( location : str ):
+    # location is module:function, where the function returns a COBJBuilder.Model.
+    module_name, _, function_name = location.partition( ":" )
+
+    if module_name == "" or function_name == "":
+        raise Exception( "Model '{}' is not in the form module:function".format( location ) )
+
+    return getattr( importlib.import_module( module_name ), function_name )()
+
+def runCBMP( job : {}, cache : JobCache = None ):
+    import CBMPBuilder
+
+    kind = getPlatform( CBMPBuilder, job["platform"] )
+
+    if cache is None:
+        CBMPBuilder.writeCBMPFilePath( job["input"], job["output"], kind )
+    else:
+        CBMPBuilder.writeCBMPFile( cache.get( "image", job["input"], CBMPBuilder.loadImage ), job["output"], kind )
+
+def runANM( job : {}, cache : JobCache = None ):
+    import ANMBuilder
+
+    quant_img = None
+
+    if cache is not None:
+        quant_img = cache.get( "anm_palette", job["palette"], ANMBuilder.loadPalette )
+
+    ANMBuilder.writeANMFile( job["input"], job["palette"], job["output"], getPlatform( ANMBuilder, job["platform"] ), job.get( "frames", 30 ), quant_img )
+
+def runPFNT( job : {}, cache : JobCache = None ):
+    import PFNTBuilder
+
+    outputs = {}
+
+    for name in job["outputs"]:
+        outputs[ getPlatform( PFNTBuilder, name ) ] = job["outputs"][ name ]
+
+    if cache is None:
+        font = PFNTBuilder.loadFontJSON( job["glyphs"] )
+    else:
+        font = cache.get( "glyphs", job["glyphs"], PFNTBuilder.loadFontJSON )
+
+    PFNTBuilder.writeFNTFiles( job["input"], outputs, font )
+
+def runCOBJ( job : {}, cache : JobCache = None ):
+    import COBJBuilder
+
+    name = job["format"].lower()
+
+    if name not in MODEL_FORMAT_NAMES:
+        raise Exception( "Unknown format '{}'. Use one of {}".format( job["format"], ", ".join( MODEL_FORMAT_NAMES ) ) )
+
+    model_format = COBJBuilder.ModelFormat[ MODEL_FORMAT_NAMES[ name ] ]
+    export_options = { option: job.get( option, False ) for option in EXPORT_OPTIONS }
+
+    if job.get( "normals" ) is not None and job["normals"] not in ("smooth", "faceted"):
+        raise Exception( "Unknown normals '{}'. Use smooth or faceted".format( job["normals"] ) )
+
+    if os.path.splitext( job["model"] )[1].lower() in MESH_EXTENSIONS:
+        import MeshImporter
+
+        welded = MeshImporter.weldMesh( MeshImporter.loadMeshFile( job["model"] ), job.get( "scale", MeshImporter.DEFAULT_SCALE ), job.get( "weld_distance", 0 ) )
+
+        if job.get( "split", False ):
+            import MeshSplitter
+
+            # The output is formatted with the part index. Pool workers of "serve" cannot start processes of their own.
+            MeshSplitter.writeSplitMesh( welded, job["output"], model_format, job.get( "jobs" ) if cache is None else 1, job.get( "optimize", False ), job.get( "normals" ), **export_options )
+            return
+
+        model = MeshImporter.makeModel( welded )
+    else:
+        model = loadModel( job["model"] )
+
+    if job.get( "normals" ) is not None:
+        import NormalGenerator
+
+        NormalGenerator.generateNormals( model, job["normals"] == "smooth" )
+
+    if job.get( "optimize", False ):
+        import ModelOptimizer
+
+        print( ModelOptimizer.optimizeModel( model ), file = sys.stderr )
+
+    model.makeFile( job["output"], model_format, **export_options )
+
+# entries is a list of "ID=PATH" strings, the files go into the bundle in that order.
+def runBundle( job : {}, cache : JobCache = None ):
+    import ResourceBundler
+
+    bundle = ResourceBundler.ResourceBundle( job.get( "alignment", 16 ) )
+
+    for specification in job["entries"]:
+        chunk_id, _, path = specification.partition( "=" )
+
+        if path == "":
+            raise Exception( "Entry '{}' is not in the form id=path".format( specification ) )
+
+        bundle.addFile( chunk_id, path )
+
+    bundle.write( job["output"] )
+
+COMMANDS = {
+    "cbmp": runCBMP,
+    "anm":  runANM,
+    "pfnt": runPFNT,
+    "cobj": runCOBJ,
+    "bundle": runBundle }
+
+def runJob( job : {}, cache : JobCache = None ):
+    command = job.get( "command" )
+
+    if command not in COMMANDS:
+        raise Exception( "Unknown command '{}'. Use one of {}".format( command, ", ".join( COMMANDS ) ) )
+
+    COMMANDS[ command ]( job, cache )
+
+def describeError( error ):
+    # A SystemExit only carries the exit code.
+    if isinstance( error, SystemExit ):
+        return "The job exited with code {}".format( error.code )
+
+    return str( error ) or type( error ).__name__
+
+# The JSON line that answers the job on line with error, with the "id" of the job when the line can be read.
+def makeErrorLine( line : str, error ):
+    job_id = None
+
+    try:
+        job_id = json.loads( line ).get( "id" )
+    except Exception:
+        pass
+
+    return json.dumps( { "id": job_id, "ok": False, "error": describeError( error ) } )
+
+# Runs one JSON line and returns the JSON line to answer it with.
+def runJobLine( line : str, cache : JobCache = None ):
+    reply = { "id": None, "ok": True }
+
+    try:
+        job = json.loads( line )
+        reply["id"] = job.get( "id" )
+        runJob( job, cache )
+    except KeyboardInterrupt:
+        raise
+    except BaseException as error:
+        # A SystemExit from a builder must not end a server or leave a job without a reply.
+        reply["ok"] = False
+        reply["error"] = describeError( error )
+
+    return json.dumps( reply )
+
+# Every line of input_stream is one job as a JSON object, like the ones the subcommands build.
+# Every job gets one JSON line back in the same order, with the "id" of the job when it had one.
+def serve( input_stream, output_stream ):
+    cache = JobCache()
+
+    for line in input_stream:
+        line = line.strip()
+
+        if line == "":
+            continue
+
+        output_stream.write( runJobLine( line, cache ) + "\n" )
+        output_stream.flush()
+
+def parsePlatformPaths( specifications : [] ):
+    outputs = {}
+
+    for specification in specifications:
+        name, _, path = specification.partition( "=" )
+
+        if path == "":
+            raise Exception( "Output '{}' is not in the form platform=path".format( specification ) )
+
+        outputs[ name ] = path
+
+    return outputs
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "Convert assets into Future Cop resources." )
+    subparsers = parser.add_subparsers( dest = "command", required = True )
+
+    cbmp_parser = subparsers.add_parser( "cbmp", help = "convert a 256x256 image into a CBMP texture" )
+    cbmp_parser.add_argument( "input" )
+    cbmp_parser.add_argument( "output" )
+    cbmp_parser.add_argument( "--platform", default = "windows" )
+
+    anm_parser = subparsers.add_parser( "anm", help = "convert a directory of 64x48 frames named 0001.png onwards into an ANM video" )
+    anm_parser.add_argument( "input" )
+    anm_parser.add_argument( "palette" )
+    anm_parser.add_argument( "output" )
+    anm_parser.add_argument( "--platform", default = "windows" )
+    anm_parser.add_argument( "--frames", type = int, default = 30 )
+
+    pfnt_parser = subparsers.add_parser( "pfnt", help = "convert a font atlas and its glyph JSON into PFNT fonts" )
+    pfnt_parser.add_argument( "input" )
+    pfnt_parser.add_argument( "glyphs" )
+    pfnt_parser.add_argument( "outputs", nargs = "+", metavar = "PLATFORM=PATH" )
+
+    cobj_parser = subparsers.add_parser( "cobj", help = "write a mesh file or the Model returned by a Python function as a COBJ resource" )
+    cobj_parser.add_argument( "model", metavar = "MESH_FILE|MODULE:FUNCTION" )
+    cobj_parser.add_argument( "output" )
+    cobj_parser.add_argument( "--format", default = "windows" )
+    cobj_parser.add_argument( "--deduplicate-buffers", action = "store_true", help = "write identical frame buffers only once" )
+    cobj_parser.add_argument( "--deduplicate-face-types", action = "store_true", help = "write equal face types only once" )
+    cobj_parser.add_argument( "--sort-primitives", action = "store_true", help = "group primitives by texture page, face type and polygon type" )
+    cobj_parser.add_argument( "--scale", type = float, default = 512.0, help = "fixed point units for one unit of a mesh file" )
+    cobj_parser.add_argument( "--weld-distance", type = int, default = 0, help = "merge mesh vertices this close in fixed point units" )
+    cobj_parser.add_argument( "--normals", choices = ("smooth", "faceted"), help = "replace the normals with ones made from the triangles and quads" )
+    cobj_parser.add_argument( "--optimize", action = "store_true", help = "remove degenerate and duplicate primitives and merge flat triangle pairs into quads" )
+    cobj_parser.add_argument( "--split", action = "store_true", help = "split a mesh file over as many models as the index limit needs, output is formatted with the part index" )
+    cobj_parser.add_argument( "--jobs", type = int, help = "how many processes build the parts of a split mesh" )
+
+    bundle_parser = subparsers.add_parser( "bundle", help = "join resources into one archive with a table of contents" )
+    bundle_parser.add_argument( "output" )
+    bundle_parser.add_argument( "entries", nargs = "+", metavar = "ID=PATH" )
+    bundle_parser.add_argument( "--alignment", type = int, default = 16, help = "every entry starts at a multiple of this many bytes" )
+
+    serve_parser = subparsers.add_parser( "serve", help = "run the JSON jobs read line by line from stdin" )
+    serve_parser.add_argument( "--processes", type = int, help = "run the jobs on a pool of this many worker processes" )
+    serve_parser.add_argument( "--max-pending", type = int, default = 64, help = "how many jobs may wait for a worker before reading stops" )
+    serve_parser.add_argument( "--socket", help = "serve the clients that connect to this Unix socket instead of stdin" )
+    serve_parser.add_argument( "--job-timeout", type = float, default = 600.0, help = "seconds a pool worker gets for one job before it is answered with an error" )
+
+    arguments = parser.parse_args( argv )
+
+    if arguments.command == "serve":
+        if arguments.processes is None and arguments.socket is None:
+            serve( sys.stdin, sys.stdout )
+        else:
+            import ConversionServer
+
+            ConversionServer.main( arguments.processes, arguments.max_pending, arguments.socket, arguments.job_timeout )
+        return 0
+
+    job = vars( arguments )
+
+    try:
+        if arguments.command == "pfnt":
+            job["outputs"] = parsePlatformPaths( arguments.outputs )
+
+        runJob( job )
+    except Exception as error:
+        print( "Error: {}".format( error ), file = sys.stderr )
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit( main() )
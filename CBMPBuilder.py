@@ -1,7 +1,11 @@
-from PIL import Image # 9.4.0-2
+from __future__ import annotations
+
 import struct
 from enum import Enum
 
+import FileOutput
+import Profiling
+
 def addColor( endian, b : float, g : float, r : float, t : int ):
     r_bit = min( int( r * 32.0 ), 31 )
     g_bit = min( int( g * 32.0 ), 31 )
@@ -22,6 +26,8 @@ def quantizeColor( source_pixel : () ):
     return (channel_0, channel_1, channel_2)
 
 def createColorPalette( image ):
+    from PIL import Image # 9.4.0-2
+
     alpha = None
 
     if image.mode in ('RGBA', 'LA'):
@@ -61,8 +67,7 @@ def createColorPalette( image ):
         else:
             opaque_amount += 255 - (opaque_amount + semi_transparent_amount)
     elif opaque_amount + semi_transparent_amount > 255:
-        print("ERROR {} and {} is actually bigger somehow!".format( opaque_amount, semi_transparent_amount ))
-        exit()
+        raise Exception("{} and {} is actually bigger somehow!".format( opaque_amount, semi_transparent_amount ))
 
     # First pass semi-transparent data.
     location = 0
@@ -259,7 +264,7 @@ class Platform( Enum ):
     Windows = 1
     Macintosh = 2
 
-def writeCBMPFile( source_img : Image, output_fnt_path : str, kind : Platform ):
+def makeCBMPResource( source_img : Image, kind : Platform ):
     status_endian = '@'
     is_ps1 = False
 
@@ -274,22 +279,35 @@ def writeCBMPFile( source_img : Image, output_fnt_path : str, kind : Platform ):
     data = makeHeader( endian = status_endian, is_playstation = is_ps1 )
 
     if is_ps1:
-        quant_img = source_img.quantize( colors = 255 )
+        quant_img = Profiling.measure( "cbmp.quantize", source_img.quantize, colors = 255 )
         qpalette = quant_img.getpalette()
 
-        data += writePIX( endian = status_endian, image = source_img, quantize_image = quant_img )
-        data += makePSPLUT( endian = status_endian, palette = qpalette )
+        data += Profiling.measure( "cbmp.writePIX", writePIX, endian = status_endian, image = source_img, quantize_image = quant_img )
+        data += Profiling.measure( "cbmp.makePSPLUT", makePSPLUT, endian = status_endian, palette = qpalette )
     else:
-        palettes = createColorPalette( source_img )
+        palettes = Profiling.measure( "cbmp.createColorPalette", createColorPalette, source_img )
+
+        data += Profiling.measure( "cbmp.makeLkUp", makeLkUp, status_endian, palettes )
+        data += Profiling.measure( "cbmp.writePIX", writePIX, endian = status_endian, image = source_img )
+        data += Profiling.measure( "cbmp.makePLUT", makePLUT, status_endian, palettes )
+
+    return data
+
+def writeCBMPFile( source_img : Image, output_fnt_path : str, kind : Platform ):
+    data = makeCBMPResource( source_img, kind )
+
+    with Profiling.span( "cbmp.write" ) as span:
+        FileOutput.writeFileAtomic( output_fnt_path, data )
+        span.addBytes( len( data ) )
 
-        data += makeLkUp( status_endian, palettes )
-        data += writePIX( endian = status_endian, image = source_img )
-        data += makePLUT( status_endian, palettes )
+def loadImage( reference_image_path : str ):
+    from PIL import Image # 9.4.0-2
 
+    with Profiling.span( "cbmp.decode" ):
+        image_read = Image.open( reference_image_path )
+        image_read.load()
 
-    new_file = open( output_fnt_path, "wb" )
-    new_file.write( data )
+    return image_read
 
 def writeCBMPFilePath( reference_image_path : str, output_fnt_path : str, kind : Platform ):
-    image_read = Image.open( reference_image_path )
-    writeCBMPFile( image_read, output_fnt_path, kind )
+    writeCBMPFile( loadImage( reference_image_path ), output_fnt_path, kind )
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import struct
+
+import PaletteMapper
+import Profiling
+
+# Reads CBMP resources made by CBMPBuilder, or by the game, back into RGBA images.
+# The pixels are never touched one at a time. RGB555 words are expanded by Pillow's raw decoders, Macintosh words
+# are byteswapped with two slice copies first, and transparency and palette colors come from table lookups.
+
+CCB_TAG  = 0x43434220
+LKUP_TAG = 0x4C6B5570
+PX16_TAG = 0x50583136
+PDAT_TAG = 0x50444154
+PLUT_TAG = 0x504C5554
+
+HEADER_SIZE = 0x4C
+IMAGE_SIZE = (256, 256)
+
+# Pillow expands a 5 bit channel v to v * 255 // 31, addColor reads the middle of the range of v better.
+RAW_TO_EXPANDED = [0] * 0x100
+
+for v in range( 0, 32 ):
+    RAW_TO_EXPANDED[ v * 255 // 31 ] = PaletteMapper.expandChannel( v )
+
+# Alpha from the high byte of a little endian PX16 word, bit 15 is semi-transparent.
+HIGH_BYTE_TO_ALPHA = bytes( 128 if (i & 0x80) != 0 else 255 for i in range( 0, 0x100 ) )
+
+NONZERO_TO_ALPHA = [0] + [255] * 0xFF
+
+class CBMPResource:
+    def __init__(self, endian : str, chunks : {}):
+        self.endian = endian
+        self.chunks = chunks
+
+    def isPlaystation( self ):
+        return PDAT_TAG in self.chunks
+
+    def getChunk( self, tag : int ):
+        if tag not in self.chunks:
+            raise Exception( "CBMP has no '{}' chunk".format( struct.pack( ">I", tag ).decode( "ascii" ) ) )
+
+        return self.chunks[ tag ]
+
+# The header tag reads "CCB " in big endian Macintosh files and " BCC" in little endian PC and PlayStation files.
+def getEndian( data ):
+    if bytes( data[0:4] ) == struct.pack( ">I", CCB_TAG ):
+        return '>'
+    if bytes( data[0:4] ) == struct.pack( "<I", CCB_TAG ):
+        return '<'
+
+    raise Exception( "Not a CBMP resource, it starts with {}".format( bytes( data[0:4] ) ) )
+
+# Returns a CBMPResource with the payload of every chunk after the header as a memoryview.
+def readChunks( data ):
+    endian = getEndian( data )
+    view = memoryview( data )
+    chunks = {}
+
+    header_size = struct.unpack_from( "{}I".format( endian ), data, 4 )[0]
+    offset = header_size
+
+    while offset + 8 <= len( data ):
+        tag, size = struct.unpack_from( "{}II".format( endian ), data, offset )
+
+        if size < 8 or offset + size > len( data ):
+            raise Exception( "Chunk at {} has size {} which does not fit the {} bytes of the resource".format( offset, size, len( data ) ) )
+
+        chunks[ tag ] = view[ offset + 8:offset + size ]
+        offset += size
+
+    return CBMPResource( endian, chunks )
+
+# Returns the 16 bit words of data in little endian order.
+def toLittleEndian( data, endian : str ):
+    if endian == '<':
+        return bytes( data )
+
+    swapped = bytearray( len( data ) )
+    swapped[0::2] = data[1::2]
+    swapped[1::2] = data[0::2]
+
+    return bytes( swapped )
+
+# raw_mode is "BGR;15" for PC words, which keep red in the high bits, and "RGB;15" for PlayStation ones.
+def decodeColors( words : bytes, size : tuple, raw_mode : str ):
+    from PIL import Image # 9.4.0-2
+
+    return Image.frombytes( "RGB", size, words, "raw", raw_mode ).point( RAW_TO_EXPANDED * 3 )
+
+# PX16 words of 0 are clear and words with bit 15 are semi-transparent.
+def decodePX16( resource : CBMPResource ):
+    from PIL import Image, ImageChops # 9.4.0-2
+
+    words = toLittleEndian( resource.getChunk( PX16_TAG ), resource.endian )
+
+    if len( words ) != 2 * IMAGE_SIZE[0] * IMAGE_SIZE[1]:
+        raise Exception( "PX16 holds {} bytes instead of {}".format( len( words ), 2 * IMAGE_SIZE[0] * IMAGE_SIZE[1] ) )
+
+    image = decodeColors( words, IMAGE_SIZE, "BGR;15" )
+
+    low = Image.frombytes( "L", IMAGE_SIZE, words[0::2] )
+    high = Image.frombytes( "L", IMAGE_SIZE, words[1::2] )
+
+    alpha = Image.frombytes( "L", IMAGE_SIZE, words[1::2].translate( HIGH_BYTE_TO_ALPHA ) )
+    visible = ImageChops.lighter( low, high ).point( NONZERO_TO_ALPHA )
+
+    image.putalpha( ImageChops.darker( alpha, visible ) )
+
+    return image
+
+# PDAT index 0 is clear, every other index is a color of PLUT. The PLUT of the PC platforms follows its LkUp
+# and is not used by PX16, but is returned the same way for inspection.
+def decodePLUT( resource : CBMPResource ):
+    plut = resource.getChunk( PLUT_TAG )
+    colors = toLittleEndian( plut[12:12 + 0x200], resource.endian )
+
+    if resource.isPlaystation():
+        raw_mode = "RGB;15"
+    else:
+        raw_mode = "BGR;15"
+
+    return (decodeColors( colors, (0x100, 1), raw_mode ), colors)
+
+def decodePDAT( resource : CBMPResource ):
+    from PIL import Image # 9.4.0-2
+
+    indexes = bytes( resource.getChunk( PDAT_TAG ) )
+
+    if len( indexes ) != IMAGE_SIZE[0] * IMAGE_SIZE[1]:
+        raise Exception( "PDAT holds {} bytes instead of {}".format( len( indexes ), IMAGE_SIZE[0] * IMAGE_SIZE[1] ) )
+
+    palette_image, words = decodePLUT( resource )
+
+    image = Image.frombytes( "P", IMAGE_SIZE, indexes )
+    image.putpalette( palette_image.tobytes() )
+
+    # Semi-transparent palette colors have bit 15 set, like PX16 words.
+    alpha_table = [0] + [HIGH_BYTE_TO_ALPHA[ words[ i * 2 + 1 ] ] for i in range( 1, 0x100 )]
+
+    alpha = Image.frombytes( "L", IMAGE_SIZE, indexes ).point( alpha_table )
+    image = image.convert( "RGB" )
+    image.putalpha( alpha )
+
+    return image
+
+def readCBMPResource( data ):
+    with Profiling.span( "cbmp.read" ) as span:
+        span.addBytes( len( data ) )
+        resource = readChunks( data )
+
+        if resource.isPlaystation():
+            return decodePDAT( resource )
+
+        return decodePX16( resource )
+
+def readCBMPFile( cbmp_path : str ):
+    with open( cbmp_path, "rb" ) as cbmp_file:
+        return readCBMPResource( cbmp_file.read() )
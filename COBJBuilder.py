@@ -4,6 +4,9 @@ import struct
 import math
 from enum import Enum
 
+import FileOutput
+import Profiling
+
 def strToChunkID(chunk_id : str):
     chunk_ascii = list(chunk_id.encode('ascii'))
 
@@ -86,6 +89,10 @@ class FaceType:
         else:
             self.opcodes[0] &= 0b11111101
 
+        # Frames from Model.internTexCoordFrames are shared, so they get copied before the first change.
+        if isinstance(self.texCoordFrames, tuple):
+            self.texCoordFrames = list(self.texCoordFrames)
+
         self.texCoordFrames[index] = texCoords
 
     def setBMPID(self, bmp_id : int):
@@ -112,6 +119,29 @@ class FaceType:
         
         return data
 
+    # Everything that ends up in 3DTL or 3DTA. Two face types with the same key can share one index.
+    def getKey(self):
+        tex_coord_frames = tuple(tuple(tuple(corner) for corner in frame) for frame in self.texCoordFrames)
+
+        return (tuple(self.opcodes), tex_coord_frames, self.bmp_id, self.unk_animation_bitfield, self.frame_duration)
+
+    # Returns the face types without duplicates and for every face type the index of its copy among them.
+    def deduplicate(face_types : list):
+        unique_indexes = {}
+        unique = []
+        remap = []
+
+        for i in face_types:
+            key = i.getKey()
+
+            if key not in unique_indexes:
+                unique_indexes[key] = len(unique)
+                unique.append(i)
+
+            remap.append(unique_indexes[key])
+
+        return (unique, remap)
+
     def makeChunk(face_types : list, endian : str):
         data = bytearray( struct.pack( "{}I".format( endian ), 1) )
 
@@ -135,23 +165,29 @@ class FaceType:
         uv_data_offset = 0
         offset_to_3DTL = 0
 
+        # Face types holding the same frames object, like the ones from Model.internTexCoordFrames, point at one copy of the UV data.
+        uv_data_offsets = {}
+        uv_data_owners = []
+
         for i in face_types:
             if i.hasTexCoordAnimation():
+                if id(i.texCoordFrames) not in uv_data_offsets:
+                    uv_data_offsets[id(i.texCoordFrames)] = uv_data_offset
+                    uv_data_owners.append(i)
+                    uv_data_offset += 8 * len(i.texCoordFrames)
+
                 data += bytearray( struct.pack( "BBBB", len(i.texCoordFrames), 0, 1, i.unk_animation_bitfield) )
                 data += bytearray( struct.pack( "{}HH".format( endian ), i.frame_duration, 0) )
-                data += bytearray( struct.pack( "{}II".format( endian ), uv_data_offset, offset_to_3DTL + 4) )
-
-                uv_data_offset += 8 * len(i.texCoordFrames)
+                data += bytearray( struct.pack( "{}II".format( endian ), uv_data_offsets[id(i.texCoordFrames)], offset_to_3DTL + 4) )
 
             if i.hasTexCoords():
                 offset_to_3DTL += 16
             else:
                 offset_to_3DTL += 4
 
-        for i in face_types:
-            if i.hasTexCoordAnimation():
-                for f in range(len(i.texCoordFrames)):
-                    data += i.makeTexFrame(f)
+        for i in uv_data_owners:
+            for f in range(len(i.texCoordFrames)):
+                data += i.makeTexFrame(f)
 
         return chunk("3DTA", endian, data)
 
@@ -405,7 +441,8 @@ class Primitive:
                 
         return data
 
-    def makeChunk(primitive_types : list, face_types : list, endian : str, is_mac : bool):
+    # face_type_remap maps the face_type_index of the primitives to indexes into face_types, when they differ.
+    def makeChunk(primitive_types : list, face_types : list, endian : str, is_mac : bool, face_type_remap : list = None):
         data = bytearray( struct.pack( "{}II".format( endian ), 1, len(primitive_types)) )
 
         face_offset_table = {}
@@ -419,11 +456,37 @@ class Primitive:
             else:
                 face_offsets += 0x04
 
+        if face_type_remap is not None:
+            face_offset_table = {i: face_offset_table[face_type_remap[i]] for i in range(0, len(face_type_remap))}
+
         for i in primitive_types:
             data += i.make(face_offset_table, endian, is_mac)
 
         return chunk("3DQL", endian, data)
 
+    # Returns the primitives in a stable order that groups them by texture page, face type and polygon type,
+    # so the engine changes its render state less often. Stars keep their order before everything else,
+    # because 3DAL stores the index of an animated star in a byte.
+    def sortByRenderState(primitive_types : list, face_types : list, face_type_remap : list = None):
+        def getRenderState(primitive):
+            if primitive.poly_type == PrimitivePolygonType.STAR:
+                return (-1, 0, 0, 0, 0, 0)
+
+            face_type_index = primitive.face_type_index
+
+            if face_type_remap is not None:
+                face_type_index = face_type_remap[face_type_index]
+
+            face_type = face_types[face_type_index]
+            bmp_id = -1
+
+            if primitive.texture and face_type.hasTexCoords():
+                bmp_id = face_type.getBMPID()
+
+            return (0, bmp_id, primitive.reflective, face_type_index, primitive.bitfield, primitive.poly_type.value)
+
+        return sorted(primitive_types, key = getRenderState)
+
     def makeStarAnimationChunk(primitive_types : list, endian : str, is_mac : bool):
         data = bytearray(struct.pack("{}I".format( endian ), 1))
 
@@ -435,6 +498,9 @@ class Primitive:
             if i.getPolygonType() == PrimitivePolygonType.STAR and i.isStarAnimationDataPresent():
                 animation_data = i.getStarAnimationData()
 
+                if index > 0xFF:
+                    raise Exception("Animated star at primitive {} is past primitive {}, the last one 3DAL can point at".format(index, 0xFF))
+
                 data += bytearray( struct.pack("{}BB".format( endian ),  index, animation_data.getSpeedFactorUnits()) )
                 data += bytearray( struct.pack("{}BBB".format( endian ), i.vertex_index[0], i.vertex_index[1], i.vertex_index[2]) )
                 data += bytearray( struct.pack("{}BBB".format( endian ), animation_data.getColor()[0], animation_data.getColor()[1], animation_data.getColor()[2]) )
@@ -453,6 +519,13 @@ class Vector3DArray:
     def setValue(self, index: int, value: tuple[int, int, int]):
         self.vector[index] = value
 
+    # Sets values[0] at index start, values[1] at start + 1 and so on in one slice assignment.
+    def setValues(self, values: list, start: int = 0):
+        if start < 0 or start + len(values) > len(self.vector):
+            raise Exception("{} values at {} do not fit a buffer of {}".format(len(values), start, len(self.vector)))
+
+        self.vector[start:start + len(values)] = values
+
     def getValue(self, index: int):
         return self.vector[index]
 
@@ -475,6 +548,12 @@ class LengthArray:
     def setValue(self, index: int, value: int):
         self.vector[index] = value
 
+    def setValues(self, values: list, start: int = 0):
+        if start < 0 or start + len(values) > len(self.vector):
+            raise Exception("{} values at {} do not fit a buffer of {}".format(len(values), start, len(self.vector)))
+
+        self.vector[start:start + len(values)] = values
+
     def getValue(self, index: int):
         return self.vector[index]
 
@@ -547,6 +626,61 @@ class BufferIDFrame:
         data += BufferIDFrame.makeLengthChunk(buffer_id_frames, endian)
         return data;
 
+    # Maps every buffer ID to the first ID in buffers holding the same values.
+    def findDuplicateIDs(buffers : dict, buffer_ids : list):
+        first_ids = {}
+        id_map = {}
+
+        for buffer_id in buffer_ids:
+            if buffer_id in id_map:
+                continue
+
+            key = tuple(buffers[buffer_id].vector)
+
+            if key not in first_ids:
+                first_ids[key] = buffer_id
+
+            id_map[buffer_id] = first_ids[key]
+
+        return id_map
+
+    # Returns new frames where identical buffers share the ID of the first frame that uses them.
+    def deduplicate(buffer_id_frames : list, vertex_buffer_ids : dict, normal_buffer_ids : dict, length_buffer_ids : dict):
+        vertex_map = BufferIDFrame.findDuplicateIDs(vertex_buffer_ids, [i.getVertexBufferID() for i in buffer_id_frames])
+        normal_map = BufferIDFrame.findDuplicateIDs(normal_buffer_ids, [i.getNormalBufferID() for i in buffer_id_frames])
+        length_map = BufferIDFrame.findDuplicateIDs(length_buffer_ids, [i.getLengthBufferID() for i in buffer_id_frames])
+
+        return [BufferIDFrame(vertex_map[i.getVertexBufferID()], normal_map[i.getNormalBufferID()], length_map[i.getLengthBufferID()]) for i in buffer_id_frames]
+
+# Ramer-Douglas-Peucker on one channel. Returns the frames to keep so that straight lines between them
+# stay within tolerance of every value. The first and last frame are always kept.
+def findKeyFrames(values : list, tolerance : float):
+    last = len(values) - 1
+
+    if last < 1:
+        return list(range(0, len(values)))
+
+    keep = {0, last}
+    segments = [(0, last)]
+
+    while len(segments) != 0:
+        start, end = segments.pop()
+
+        if end - start < 2:
+            continue
+
+        step = (values[end] - values[start]) / (end - start)
+        errors = [abs(values[i] - (values[start] + step * (i - start))) for i in range(start + 1, end)]
+        worst = max(errors)
+
+        if worst > tolerance:
+            split = start + 1 + errors.index(worst)
+            keep.add(split)
+            segments.append((start, split))
+            segments.append((split, end))
+
+    return sorted(keep)
+
 class BoneAttribute(Enum):
     rotation_z = 0
     rotation_y = 1
@@ -561,6 +695,7 @@ class Bone:
         self.childern = []
 
         self.attributes = 6 * [0.0]
+        self.key_frames = 6 * [None] # Frames reduceKeyFrames kept for every animated attribute, None keeps them all.
 
         self.vertex_start  = 0
         self.vertex_amount = 0
@@ -585,16 +720,26 @@ class Bone:
         if childIndex is None:
             return False
 
-        del self.childern[i]
+        child.parent = None
+
+        del self.childern[childIndex]
         return True
 
     def getChildIndex(self, child: Bone):
-        for i in range(0, len(self.children)):
-            if child == self.children[i]:
+        for i in range(0, len(self.childern)):
+            if child == self.childern[i]:
                 return i
         return None
 
+    def getChildAmount(self):
+        return len(self.childern)
+
+    def getChild(self, index: int):
+        return self.childern[index]
+
     def setAnimationState(self, attribute: BoneAttribute, hasAnimation: bool):
+        self.key_frames[attribute.value] = None
+
         if not hasAnimation and isinstance(self.attributes[attribute.value], list):
             single_value = self.attributes[attribute.value][0]
 
@@ -612,10 +757,26 @@ class Bone:
         else:
             return False
 
+    def setAttribute(self, attribute: BoneAttribute, value: float, frame_index: int = 0):
+        self.key_frames[attribute.value] = None
+
+        if isinstance(self.attributes[attribute.value], list):
+            self.attributes[attribute.value][frame_index] = float(value)
+        else:
+            self.attributes[attribute.value] = float(value)
+
+    def getAttribute(self, attribute: BoneAttribute, frame_index: int = 0):
+        if isinstance(self.attributes[attribute.value], list):
+            return self.attributes[attribute.value][frame_index]
+        return self.attributes[attribute.value]
+
     def setFrameAmount(self, frame_amount: int):
         self.frame_amount = frame_amount
+        self.key_frames = 6 * [None]
+
+        for index in range(0, len(self.attributes)):
+            attr = self.attributes[index]
 
-        for attr in self.attributes:
             if isinstance(attr, float):
                 continue
 
@@ -625,7 +786,7 @@ class Bone:
             for i in range(0, min(self.frame_amount, len(attr))):
                 new_values[i] = attr[i]
 
-            attr = new_values
+            self.attributes[index] = new_values
 
         for bone in self.childern:
             bone.setFrameAmount(frame_amount)
@@ -653,29 +814,94 @@ class Bone:
     def getNormalAmount(self):
         return self.normal_amount
 
-    def cleanup(self):
-        for attr in self.attributes:
+    # Animations that never move further than tolerance from their middle become that constant value.
+    def cleanup(self, position_tolerance: float = 0.0, rotation_tolerance: float = 0.0):
+        for attribute in BoneAttribute:
+            attr = self.attributes[attribute.value]
+
+            if isinstance(attr, float):
+                continue
+
+            tolerance = rotation_tolerance if attribute.value <= BoneAttribute.rotation_x.value else position_tolerance
+            low = min(attr)
+            high = max(attr)
+
+            if high - low <= 2.0 * tolerance:
+                self.attributes[attribute.value] = attr[0] if low == high else (low + high) / 2.0 # Reduce animation to constant value.
+                self.key_frames[attribute.value] = None
+
+        for bone in self.childern:
+            bone.cleanup(position_tolerance, rotation_tolerance)
+
+    # Keeps only the frames of every animation that linear interpolation cannot rebuild within the tolerance.
+    # Returns (frames before, frames after) over this bone and its children.
+    def reduceKeyFrames(self, position_tolerance: float, rotation_tolerance: float):
+        before = 0
+        after = 0
+
+        for attribute in BoneAttribute:
+            attr = self.attributes[attribute.value]
+
             if isinstance(attr, float):
                 continue
 
-            same = True
+            tolerance = rotation_tolerance if attribute.value <= BoneAttribute.rotation_x.value else position_tolerance
+
+            self.key_frames[attribute.value] = findKeyFrames(attr, tolerance)
+
+            before += len(attr)
+            after += len(self.key_frames[attribute.value])
+
+        for bone in self.childern:
+            child_before, child_after = bone.reduceKeyFrames(position_tolerance, rotation_tolerance)
+            before += child_before
+            after += child_after
+
+        return (before, after)
+
+    def getKeyFrames(self, attribute: BoneAttribute):
+        if self.key_frames[attribute.value] is None:
+            return list(range(0, len(self.attributes[attribute.value])))
+        return self.key_frames[attribute.value]
+
+    # One value for every frame, with straight lines between the kept keys and constants repeated.
+    # The engine is not known to interpolate between keys, so whatever writes the channels should take these.
+    def getFrameValues(self, attribute: BoneAttribute):
+        attr = self.attributes[attribute.value]
+
+        if isinstance(attr, float):
+            return self.frame_amount * [attr]
 
-            for i in range(0, len(attr)):
-                if attr[0] != attr[i]:
-                    same = False
-                    break;
+        keys = self.getKeyFrames(attribute)
+        values = []
 
-            if same:
-                attr = attr[0] # Reduce animation to constant value.
+        for start, end in zip(keys, keys[1:]):
+            step = (attr[end] - attr[start]) / (end - start)
+            values += [attr[start] + step * (i - start) for i in range(start, end)]
 
+        values.append(attr[keys[-1]])
+
+        return values
 
 class Skeleton:
     def __init__(self):
-        self.initial_bones = [Bone]
+        self.initial_bones = [Bone()]
 
     def getBone(self):
         return self.initial_bones[0]
 
+    # Every bone with its parents before its children.
+    def getBones(self):
+        bones = []
+        pending = list(reversed(self.initial_bones))
+
+        while len(pending) != 0:
+            bone = pending.pop()
+            bones.append(bone)
+            pending += reversed(bone.childern)
+
+        return bones
+
     def getFrameCount(self):
         return self.initial_bones[0].getFrameAmount()
 
@@ -686,6 +912,21 @@ class Skeleton:
     def buildBoundingBoxArray(self):
         pass
 
+    # Folds channels that stay within the tolerance into constants, then drops every key linear interpolation
+    # rebuilds within it. Rotations are in degrees and positions in model units, like the attributes.
+    # Returns (frames before, frames after) over the channels that stayed animated.
+    def reduceAnimation(self, position_tolerance: float = 0.5, rotation_tolerance: float = 0.1):
+        before = 0
+        after = 0
+
+        for bone in self.initial_bones:
+            bone.cleanup(position_tolerance, rotation_tolerance)
+            bone_before, bone_after = bone.reduceKeyFrames(position_tolerance, rotation_tolerance)
+            before += bone_before
+            after += bone_after
+
+        return (before, after)
+
 class BoundingBox:
     def __init__(self):
         self.position = (0, 0, 0)
@@ -772,6 +1013,8 @@ class Model:
         self.is_semi_transparent = False
         self.child_vertex_positions = []
         self.face_types = []
+        self.face_type_lookup = None # FaceType key to index, built by the first internFaceType.
+        self.tex_coord_frame_pool = {} # Frames to the one tuple of them that face types share.
         self.primitives = []
         self.bounding_box_frame_data = []
 
@@ -794,11 +1037,76 @@ class Model:
         return self.face_types[index]
 
     def appendFaceType(self, face_type : FaceType):
+        if self.face_type_lookup is not None:
+            self.face_type_lookup.setdefault(face_type.getKey(), len(self.face_types))
+
         self.face_types.append(face_type)
 
     def insertFaceType(self, index : int, face_type : FaceType):
+        self.face_type_lookup = None # Every index after index moved.
         self.face_types.insert(index, face_type)
 
+    # Returns the index of a face type equal to face_type, appending face_type only when there is none.
+    # A face type must not be changed after it was interned, or its key in the lookup goes stale.
+    def internFaceType(self, face_type : FaceType):
+        if self.face_type_lookup is None:
+            self.face_type_lookup = {}
+
+            for i in range(0, len(self.face_types)):
+                self.face_type_lookup.setdefault(self.face_types[i].getKey(), i)
+
+        key = face_type.getKey()
+
+        if key not in self.face_type_lookup:
+            self.face_type_lookup[key] = len(self.face_types)
+            self.face_types.append(face_type)
+
+        return self.face_type_lookup[key]
+
+    # Returns the pooled tuple equal to frames. Face types holding it share one copy of the UV data in 3DTA.
+    def internTexCoordFrames(self, frames : list):
+        key = tuple(tuple(tuple(corner) for corner in frame) for frame in frames)
+
+        return self.tex_coord_frame_pool.setdefault(key, key)
+
+    # Gives face_type the pooled frames and makes it animate through them.
+    def setTexCoordAnimation(self, face_type : FaceType, frames : list, frame_duration : int):
+        if len(frames) < 1 or len(frames) > 0xFF:
+            raise Exception("Texture coordinate animations need between 1 and 255 frames, not {}".format(len(frames)))
+
+        face_type.setTexCoords(True, frames[0])
+        face_type.texCoordFrames = self.internTexCoordFrames(frames)
+        face_type.setTexFrameDurationInUnits(frame_duration)
+
+    # Animates the face types at face_type_indexes through a sprite sheet of cell_width by cell_height cells starting at (x, y).
+    # The cells are taken left to right and then top to bottom, columns to a row. Returns the pooled frames.
+    def setTexCoordAnimationGrid(self, face_type_indexes : list, x : int, y : int, cell_width : int, cell_height : int, columns : int, frame_amount : int, frame_duration : int, bmp_id : int = None):
+        frames = []
+
+        for f in range(0, frame_amount):
+            left = x + (f % columns) * cell_width
+            top = y + (f // columns) * cell_height
+            right = left + cell_width - 1
+            bottom = top + cell_height - 1
+
+            if left < 0 or top < 0 or right > 0xFF or bottom > 0xFF:
+                raise Exception("Sprite sheet cell {} at ({}, {}) does not fit in the texture".format(f, left, top))
+
+            frames.append(((left, top), (right, top), (right, bottom), (left, bottom)))
+
+        frames = self.internTexCoordFrames(frames)
+
+        for index in face_type_indexes:
+            face_type = self.face_types[index]
+            self.setTexCoordAnimation(face_type, frames, frame_duration)
+
+            if bmp_id is not None:
+                face_type.setBMPID(bmp_id)
+
+        self.face_type_lookup = None # The keys of the face types changed.
+
+        return frames
+
     def getPrimitiveAmount(self):
         return len(self.primitives)
 
@@ -951,7 +1259,13 @@ class Model:
 
         return chunk("4DGI", endian, data)
 
-    def makeResource(self, model_format : ModelFormat):
+    # deduplicate_buffers makes frames with identical buffers share one buffer ID in 3DRF, so every
+    # distinct 4DVL, 4DNL and 3DRL chunk is written only once. Static props and static normals shrink the most.
+    # deduplicate_face_types writes equal face types once and points the primitives at the copy that is kept,
+    # without changing face_types or the primitives of the model.
+    # sort_primitives writes 3DQL grouped by render state with Primitive.sortByRenderState. 3DAL is written
+    # from the same order, so its primitive indexes follow the stars to where they were moved.
+    def makeResource(self, model_format : ModelFormat, deduplicate_buffers : bool = False, deduplicate_face_types : bool = False, sort_primitives : bool = False):
         endian = '<'
         is_mac = False
 
@@ -959,19 +1273,47 @@ class Model:
             endian = '>'
             is_mac = True
 
-        data  = self.makeHeader(endian, is_mac)
-        data += FaceType.makeChunk(self.face_types, endian)
-        data += FaceType.makeOptAnimationChunk(self.face_types, endian)
-        data += Primitive.makeChunk(self.primitives, self.face_types, endian, is_mac)
-        data += Primitive.makeStarAnimationChunk(self.primitives, endian, is_mac)
-        data += BufferIDFrame.makeChunks(self.buffer_id_frames, endian)
+        buffer_id_frames = self.buffer_id_frames
+
+        if deduplicate_buffers:
+            buffer_id_frames = Profiling.measure("cobj.deduplicate", BufferIDFrame.deduplicate, self.buffer_id_frames, self.vertex_buffer_ids, self.normal_buffer_ids, self.length_buffer_ids)
+
+        face_types = self.face_types
+        face_type_remap = None
+
+        if deduplicate_face_types:
+            face_types, face_type_remap = Profiling.measure("cobj.deduplicateFaceTypes", FaceType.deduplicate, self.face_types)
+
+        primitives = self.primitives
+
+        if sort_primitives:
+            primitives = Profiling.measure("cobj.sortPrimitives", Primitive.sortByRenderState, self.primitives, face_types, face_type_remap)
+
+        data  = Profiling.measure("cobj.4DGI", self.makeHeader, endian, is_mac)
+        data += Profiling.measure("cobj.3DTL", FaceType.makeChunk, face_types, endian)
+        data += Profiling.measure("cobj.3DTA", FaceType.makeOptAnimationChunk, face_types, endian)
+        data += Profiling.measure("cobj.3DQL", Primitive.makeChunk, primitives, face_types, endian, is_mac, face_type_remap)
+        data += Profiling.measure("cobj.3DAL", Primitive.makeStarAnimationChunk, primitives, endian, is_mac)
+        data += Profiling.measure("cobj.3DRF", BufferIDFrame.makeChunks, buffer_id_frames, endian)
+
+        written_vertex_ids = set()
+        written_normal_ids = set()
+        written_length_ids = set()
+
+        for i in buffer_id_frames:
+            if i.getVertexBufferID() not in written_vertex_ids:
+                written_vertex_ids.add(i.getVertexBufferID())
+                data += Profiling.measure("cobj.4DVL", self.vertex_buffer_ids[i.getVertexBufferID()].makeChunk, i.getVertexBufferID(), "4DVL", endian)
+
+            if i.getNormalBufferID() not in written_normal_ids:
+                written_normal_ids.add(i.getNormalBufferID())
+                data += Profiling.measure("cobj.4DNL", self.normal_buffer_ids[i.getNormalBufferID()].makeChunk, i.getNormalBufferID(), "4DNL", endian)
 
-        for i in self.buffer_id_frames:
-            data += self.vertex_buffer_ids[i.getVertexBufferID()].makeChunk(i.getVertexBufferID(), "4DVL", endian)
-            data += self.normal_buffer_ids[i.getNormalBufferID()].makeChunk(i.getNormalBufferID(), "4DNL", endian)
-            data += self.length_buffer_ids[i.getLengthBufferID()].makeChunk(i.getLengthBufferID(), endian)
+            if i.getLengthBufferID() not in written_length_ids:
+                written_length_ids.add(i.getLengthBufferID())
+                data += Profiling.measure("cobj.3DRL", self.length_buffer_ids[i.getLengthBufferID()].makeChunk, i.getLengthBufferID(), endian)
 
-        data += BoundingBox.makeChunk(endian, self.vertex_buffer_ids, self.buffer_id_frames, self.bounding_box_frame_data)
+        data += Profiling.measure("cobj.3DBB", BoundingBox.makeChunk, endian, self.vertex_buffer_ids, buffer_id_frames, self.bounding_box_frame_data)
 
         if len(self.buffer_id_frames) != 1:
             anm_chunk  = bytearray( struct.pack( "{}I".format( endian ), 1) )
@@ -982,8 +1324,9 @@ class Model:
 
         return data
 
-    def makeFile(self, filepath : str, model_format : ModelFormat):
-        data = self.makeResource(model_format)
+    def makeFile(self, filepath : str, model_format : ModelFormat, deduplicate_buffers : bool = False, deduplicate_face_types : bool = False, sort_primitives : bool = False):
+        data = self.makeResource(model_format, deduplicate_buffers, deduplicate_face_types, sort_primitives)
 
-        new_file = open( filepath, "wb" )
-        new_file.write( data )
+        with Profiling.span("cobj.write") as span:
+            FileOutput.writeFileAtomic(filepath, data)
+            span.addBytes(len(data))
@@ -0,0 +1,154 @@
+import io
+import multiprocessing
+import os
+import queue
+import signal
+import socketserver
+import stat
+import sys
+import threading
+
+import BuildTool
+
+# Runs BuildTool jobs on a pool of long lived worker processes.
+# Every worker imports PIL and the builders once and keeps a BuildTool.JobCache of decoded images,
+# ANM palettes and glyph tables, so a job only pays for its own encoding.
+# At most max_pending jobs are waiting or running at once. When that many are pending the server stops
+# reading from the clients until a result has been written back.
+# A job whose worker dies, or that runs longer than job_timeout seconds, is answered with an error so its slot is
+# given back. A job past its timeout may still finish on its worker, its result is thrown away.
+
+worker_cache = None
+
+def initWorker():
+    global worker_cache
+
+    worker_cache = BuildTool.JobCache()
+
+    import ANMBuilder
+    import CBMPBuilder
+    import COBJBuilder
+    import PFNTBuilder
+
+    try:
+        from PIL import Image # 9.4.0-2
+    except ImportError:
+        pass # Only cobj jobs can be run then.
+
+def runWorkerJobLine( line : str ):
+    return BuildTool.runJobLine( line, worker_cache )
+
+class ConversionServer:
+    def __init__(self, processes : int = None, max_pending : int = 64, job_timeout : float = 600.0):
+        self.pool = multiprocessing.Pool( processes, initializer = initWorker )
+        self.pending = threading.BoundedSemaphore( max_pending )
+        self.job_timeout = job_timeout
+        self.has_timed_out = False
+
+    def submit(self, line : str):
+        self.pending.acquire()
+
+        try:
+            return self.pool.apply_async( runWorkerJobLine, (line,) )
+        except Exception:
+            self.pending.release()
+            raise
+
+    # Results are written in the order the jobs were read, whichever worker finishes first.
+    def writeResults(self, results : queue.Queue, output_stream):
+        is_connected = True
+
+        while True:
+            entry = results.get()
+
+            if entry is None:
+                return
+
+            line, result = entry
+
+            # A worker that dies during a job never sends its result, so the wait is bounded.
+            try:
+                reply = result.get( self.job_timeout )
+            except multiprocessing.TimeoutError:
+                self.has_timed_out = True
+                reply = BuildTool.makeErrorLine( line, "The job did not finish within {} seconds".format( self.job_timeout ) )
+            except BaseException as error:
+                reply = BuildTool.makeErrorLine( line, error )
+            finally:
+                self.pending.release()
+
+            if not is_connected:
+                continue # Keep collecting so the pending slots of a lost client are given back.
+
+            try:
+                output_stream.write( reply + "\n" )
+                output_stream.flush()
+            except (OSError, ValueError):
+                is_connected = False
+
+    def serveStreams(self, input_stream, output_stream):
+        results = queue.Queue()
+        writer = threading.Thread( target = self.writeResults, args = (results, output_stream) )
+        writer.start()
+
+        try:
+            for line in input_stream:
+                line = line.strip()
+
+                if line == "":
+                    continue
+
+                results.put( (line, self.submit( line )) )
+        finally:
+            results.put( None )
+            writer.join()
+
+    # A job past its timeout may never end, so then the workers are stopped instead of waited for.
+    def close(self):
+        if self.has_timed_out:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+
+        self.pool.join()
+
+class ClientHandler( socketserver.StreamRequestHandler ):
+    def handle(self):
+        input_stream = io.TextIOWrapper( self.rfile, encoding = "utf-8" )
+        output_stream = io.TextIOWrapper( self.wfile, encoding = "utf-8", write_through = True )
+
+        self.server.conversion_server.serveStreams( input_stream, output_stream )
+
+# Every client that connects to socket_path is served at the same time on its own thread.
+def serveSocket( conversion_server : ConversionServer, socket_path : str ):
+    if os.path.exists( socket_path ):
+        if not stat.S_ISSOCK( os.stat( socket_path ).st_mode ):
+            raise Exception( "'{}' exists and is not a socket".format( socket_path ) )
+
+        os.unlink( socket_path ) # Left over from a server that did not shut down.
+
+    # A build system stops the server with SIGTERM, which gets the same clean up as Ctrl+C.
+    signal.signal( signal.SIGTERM, signal.default_int_handler )
+
+    server = socketserver.ThreadingUnixStreamServer( socket_path, ClientHandler )
+    server.daemon_threads = True
+    server.conversion_server = conversion_server
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink( socket_path )
+
+def main( processes : int = None, max_pending : int = 64, socket_path : str = None, job_timeout : float = 600.0 ):
+    conversion_server = ConversionServer( processes, max_pending, job_timeout )
+
+    try:
+        if socket_path is None:
+            conversion_server.serveStreams( sys.stdin, sys.stdout )
+        else:
+            serveSocket( conversion_server, socket_path )
+    finally:
+        conversion_server.close()
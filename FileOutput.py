@@ -0,0 +1,29 @@
+import contextlib
+import os
+import tempfile
+
+# mkstemp creates files only the owner can read, so give the result the mode open() would have.
+# The umask can only be read by setting it, which is done once here while importing.
+UMASK = os.umask( 0 )
+os.umask( UMASK )
+
+# Gives a file to write to that is a temporary file next to path and renamed over it once the block ends,
+# so a reader never sees a half written resource and a failed write leaves the old file alone.
+@contextlib.contextmanager
+def openFileAtomic( path : str ):
+    directory = os.path.dirname( os.path.abspath( path ) )
+    descriptor, temporary_path = tempfile.mkstemp( dir = directory, prefix = "." + os.path.basename( path ) + ".", suffix = ".tmp" )
+
+    try:
+        with os.fdopen( descriptor, "wb" ) as new_file:
+            os.chmod( temporary_path, 0o666 & ~UMASK )
+            yield new_file
+
+        os.replace( temporary_path, path )
+    except BaseException:
+        os.unlink( temporary_path )
+        raise
+
+def writeFileAtomic( path : str, data ):
+    with openFileAtomic( path ) as new_file:
+        new_file.write( data )
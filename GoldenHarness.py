@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import random
+import sys
+
+import ANMBuilder
+import CBMPBuilder
+import COBJBuilder
+import PFNTBuilder
+import Benchmark
+
+# Records what the builders output today as SHA-256 digests, then checks that the builders or any
+# alternative implementation of an encoder still produce exactly the same bytes.
+
+# The digests of the baseline builders, checked by tests/test_GoldenHarness.py.
+GOLDEN_PATH = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "tests", "golden.json" )
+
+# Outputs that go through Image.quantize, which can change between Pillow versions.
+QUANTIZED_LABELS = ("writePIX[Playstation]", "createColorPalette", "writeSingleFrame")
+
+class Corpus:
+    def __init__(self, seed : int):
+        rng = random.Random( seed )
+
+        self.seed = seed
+
+        # createColorPalette needs an alpha channel with clear, opaque and semi-transparent pixels.
+        self.textures = [ Benchmark.makeTexture( rng ) for i in range( 0, 3 ) ]
+        self.opaque_textures = [ Benchmark.makeTexture( rng ).convert( "RGB" ) for i in range( 0, 2 ) ]
+
+        self.anm_palette = Benchmark.makeTexture( rng, 64, 48 ).convert( "RGB" ).quantize( colors = 255 )
+        self.anm_frames = [ Benchmark.makeTexture( rng, 64, 48 ) for i in range( 0, 4 ) ]
+        self.anm_frames.append( Benchmark.makeTexture( rng, 64, 48 ).convert( "RGB" ) )
+
+        self.atlases = [ Benchmark.makeFontAtlas( rng, height )[0] for height in (16, 64) ]
+
+        self.models = [
+            Benchmark.makeModel( rng, 4, 1, 1, 1 ),
+            Benchmark.makeModel( rng, 64, 100, 1 ),
+            Benchmark.makeModel( rng, 256, 300, 6 ),
+            makeFeatureModel() ]
+
+def makeFeatureModel():
+    # Covers the optional chunks: texture coordinate animation, star animation and lines.
+    model = Benchmark.makeModel( random.Random( 0 ), 16, 8, 3, 4 )
+
+    face_type = model.getFaceType( 0 )
+    face_type.setTexCoordFrameCount( 3 )
+    face_type.setTexCoords( True, ((0, 0), (32, 0), (32, 32), (0, 32)), 1 )
+    face_type.setTexCoords( True, ((32, 0), (64, 0), (64, 32), (32, 32)), 2 )
+    face_type.setTexFrameDurationInUnits( 40 )
+
+    star = COBJBuilder.Primitive()
+    star.setTypeStar( 3, 0, [255, 128, 0] )
+    star.setStarVertexAmount( 6 )
+    star.setStarAnimationData( True )
+    star.getStarAnimationData().setColor( (0, 128, 255) )
+    star.getStarAnimationData().setSpeedFactorUnits( 12 )
+    model.appendPrimitive( star )
+
+    line = COBJBuilder.Primitive()
+    line.setTypeLine( 1, 0, 2, 0 )
+    model.appendPrimitive( line )
+
+    billboard = COBJBuilder.Primitive()
+    billboard.setTypeBillboard( 5, 0 )
+    billboard.setFaceTypeIndex( 1 )
+    model.appendPrimitive( billboard )
+
+    return model
+
+PLATFORM_ENDIANS = ( (CBMPBuilder.Platform.Playstation, '<'), (CBMPBuilder.Platform.Windows, '<'), (CBMPBuilder.Platform.Macintosh, '>') )
+
+def runWritePIX( function, corpus : Corpus ):
+    for kind, endian in PLATFORM_ENDIANS:
+        for index, texture in enumerate( corpus.textures + corpus.opaque_textures ):
+            if kind is CBMPBuilder.Platform.Playstation:
+                data = function( endian, texture, texture.quantize( colors = 255 ) )
+            else:
+                data = function( endian, texture )
+
+            yield ("writePIX[{}]#{}".format( kind.name, index ), data)
+
+def runCreateColorPalette( function, corpus : Corpus ):
+    for index, texture in enumerate( corpus.textures ):
+        semi_palette, opaque_palette = function( texture )
+
+        yield ("createColorPalette#{}".format( index ), json.dumps( [ list( semi_palette ), list( opaque_palette ) ] ).encode( "ascii" ))
+
+def runWriteSingleFrame( function, corpus : Corpus ):
+    for index, frame in enumerate( corpus.anm_frames ):
+        yield ("writeSingleFrame#{}".format( index ), function( frame, corpus.anm_palette ))
+
+def runMakeImageData( function, corpus : Corpus ):
+    for index, atlas in enumerate( corpus.atlases ):
+        yield ("makeImageData#{}".format( index ), function( atlas ))
+
+def runMakeResource( function, corpus : Corpus ):
+    # ModelFormat.PLAYSTATION is an alias of WINDOWS, so go through the names to cover all three.
+    for format_name, model_format in COBJBuilder.ModelFormat.__members__.items():
+        for index, model in enumerate( corpus.models ):
+            yield ("Model.makeResource[{}]#{}".format( format_name, index ), function( model, model_format ))
+
+# Each target maps to the function that runs it and the builder function it is checked against.
+TARGETS = {
+    "writePIX":           (runWritePIX,           lambda: CBMPBuilder.writePIX),
+    "createColorPalette": (runCreateColorPalette, lambda: CBMPBuilder.createColorPalette),
+    "writeSingleFrame":   (runWriteSingleFrame,   lambda: ANMBuilder.writeSingleFrame),
+    "makeImageData":      (runMakeImageData,      lambda: PFNTBuilder.makeImageData),
+    "Model.makeResource": (runMakeResource,       lambda: COBJBuilder.Model.makeResource) }
+
+def computeDigests( corpus : Corpus, implementations : {} = {} ):
+    digests = {}
+
+    for target in TARGETS:
+        run, reference = TARGETS[ target ]
+        function = implementations.get( target, reference() )
+
+        for label, data in run( function, corpus ):
+            digests[ label ] = hashlib.sha256( data ).hexdigest()
+
+    return digests
+
+def compareDigests( golden : {}, digests : {} ):
+    mismatches = []
+
+    for label in golden:
+        if digests.get( label ) != golden[ label ]:
+            mismatches.append( label )
+
+    return mismatches
+
+def recordGolden( path : str, seed : int ):
+    import PIL
+
+    golden = {
+        "seed": seed,
+        "pillow": PIL.__version__,
+        "digests": computeDigests( Corpus( seed ) ) }
+
+    with open( path, "w" ) as golden_file:
+        json.dump( golden, golden_file, indent = 4, sort_keys = True )
+
+    return golden
+
+def loadGolden( path : str ):
+    with open( path, "r" ) as golden_file:
+        return json.load( golden_file )
+
+# candidates maps a name to a (target, function) pair.
+# Returns a dictionary of the builders and every candidate name to the labels whose bytes changed.
+def verifyGolden( golden : {}, candidates : {} = {} ):
+    corpus = Corpus( golden["seed"] )
+
+    results = { "builders": compareDigests( golden["digests"], computeDigests( corpus ) ) }
+
+    for name in candidates:
+        target, function = candidates[ name ]
+
+        if target not in TARGETS:
+            raise Exception( "There is no target named '{}'. The targets are {}".format( target, ", ".join( TARGETS ) ) )
+
+        digests = {}
+
+        for label, data in TARGETS[ target ][0]( function, corpus ):
+            digests[ label ] = hashlib.sha256( data ).hexdigest()
+
+        results[ name ] = compareDigests( { label: golden["digests"][ label ] for label in digests }, digests )
+
+    return results
+
+def loadCandidate( specification : str ):
+    target, _, location = specification.partition( "=" )
+    module_name, _, attribute_path = location.partition( ":" )
+
+    if target == "" or module_name == "" or attribute_path == "":
+        raise Exception( "Candidate '{}' is not in the form target=module:function".format( specification ) )
+
+    function = importlib.import_module( module_name )
+
+    for attribute in attribute_path.split( "." ):
+        function = getattr( function, attribute )
+
+    return (specification, (target, function))
+
+def main( argv = None ):
+    parser = argparse.ArgumentParser( description = "Record or check the golden output digests of the builders." )
+    subparsers = parser.add_subparsers( dest = "command", required = True )
+
+    record_parser = subparsers.add_parser( "record", help = "write the digests of the current builders" )
+    record_parser.add_argument( "golden_path", nargs = "?", default = GOLDEN_PATH )
+    record_parser.add_argument( "--seed", type = int, default = 1998 )
+
+    check_parser = subparsers.add_parser( "check", help = "check the builders and candidates against the digests" )
+    check_parser.add_argument( "golden_path", nargs = "?", default = GOLDEN_PATH )
+    check_parser.add_argument( "--candidate", action = "append", default = [], metavar = "TARGET=MODULE:FUNCTION", help = "an alternative implementation of a target, can be given more than once" )
+
+    arguments = parser.parse_args( argv )
+
+    if arguments.command == "record":
+        golden = recordGolden( arguments.golden_path, arguments.seed )
+        print( "Recorded {} digests to {}".format( len( golden["digests"] ), arguments.golden_path ) )
+        return 0
+
+    import PIL
+
+    golden = loadGolden( arguments.golden_path )
+
+    if golden["pillow"] != PIL.__version__:
+        print( "Warning: the digests were recorded with Pillow {} but this is Pillow {}. Quantized outputs can differ.".format( golden["pillow"], PIL.__version__ ) )
+
+    candidates = dict( loadCandidate( specification ) for specification in arguments.candidate )
+
+    failed = False
+
+    for name, mismatches in verifyGolden( golden, candidates ).items():
+        if len( mismatches ) == 0:
+            print( "{}: identical".format( name ) )
+        else:
+            failed = True
+            print( "{}: {} outputs differ".format( name, len( mismatches ) ) )
+
+            for label in mismatches:
+                print( "    {}".format( label ) )
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit( main() )
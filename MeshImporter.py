@@ -0,0 +1,595 @@
+from __future__ import annotations
+
+import base64
+import json
+import math
+import os
+import struct
+import urllib.parse
+
+import COBJBuilder
+import Profiling
+
+# Turns OBJ and glTF meshes into COBJBuilder.Model.
+# Loading gives a Mesh with floating point frames. weldMesh converts it to the fixed point scale and merges
+# duplicate positions and normals with hash tables, so the cost grows with the vertex count and never with its square.
+# makeModel then fills the buffers of a Model from the welded mesh a whole frame at a time.
+
+DEFAULT_SCALE = 512.0 # Fixed point units for one unit of the source file.
+NORMAL_ONE = 4096     # The length of a unit normal in 4DNL.
+INDEX_LIMIT = 0x100   # Primitive stores every index in a single byte.
+
+class MeshFace:
+    # Every list has three or four corners. normal_indexes and tex_coord_indexes are None when the face has none.
+    def __init__(self, position_indexes : list, normal_indexes : list = None, tex_coord_indexes : list = None, material : str = None):
+        self.position_indexes = position_indexes
+        self.normal_indexes = normal_indexes
+        self.tex_coord_indexes = tex_coord_indexes
+        self.material = material
+
+class Mesh:
+    def __init__(self):
+        self.frames = []        # Every frame is a list of (x, y, z) positions.
+        self.normal_frames = [] # Every frame is a list of (x, y, z) normals, or the list is empty.
+        self.tex_coords = []    # (u, v) with v going down the image like glTF does.
+        self.faces = []
+
+    def getFrameAmount(self):
+        return len(self.frames)
+
+    def hasNormals(self):
+        return len(self.normal_frames) != 0
+
+    def addFrame(self, positions : list, normals : list = None):
+        if len(self.frames) != 0 and len(positions) != len(self.frames[0]):
+            raise Exception("Frame {} has {} positions but frame 0 has {}".format(len(self.frames), len(positions), len(self.frames[0])))
+
+        if normals is not None and len(self.normal_frames) != 0 and len(normals) != len(self.normal_frames[0]):
+            raise Exception("Frame {} has {} normals but frame 0 has {}".format(len(self.frames), len(normals), len(self.normal_frames[0])))
+
+        self.frames.append(positions)
+
+        if normals is not None:
+            self.normal_frames.append(normals)
+
+    def addPolygon(self, position_indexes : list, normal_indexes : list, tex_coord_indexes : list, material : str):
+        # Anything with more than four corners becomes a fan of triangles.
+        if len(position_indexes) <= 4:
+            self.faces.append(MeshFace(position_indexes, normal_indexes, tex_coord_indexes, material))
+            return
+
+        for i in range(1, len(position_indexes) - 1):
+            corners = [0, i, i + 1]
+
+            self.faces.append(MeshFace(
+                [position_indexes[c] for c in corners],
+                None if normal_indexes is None else [normal_indexes[c] for c in corners],
+                None if tex_coord_indexes is None else [tex_coord_indexes[c] for c in corners],
+                material))
+
+# OBJ
+
+def parseOBJIndex(text : str, amount : int):
+    if text == "":
+        return None
+
+    index = int(text)
+
+    # Negative indexes count back from the newest element.
+    if index < 0:
+        return amount + index
+
+    return index - 1
+
+def loadOBJ(path : str):
+    positions = []
+    normals = []
+    tex_coords = []
+    mesh = Mesh()
+    material = None
+
+    with open(path, "r") as obj_file:
+        for line in obj_file:
+            parts = line.split()
+
+            if len(parts) == 0 or parts[0].startswith("#"):
+                continue
+
+            tag = parts[0]
+
+            if tag == "v":
+                positions.append((float(parts[1]), float(parts[2]), float(parts[3])))
+            elif tag == "vn":
+                normals.append((float(parts[1]), float(parts[2]), float(parts[3])))
+            elif tag == "vt":
+                # OBJ puts v = 0 at the bottom of the image.
+                tex_coords.append((float(parts[1]), 1.0 - float(parts[2]) if len(parts) > 2 else 1.0))
+            elif tag == "usemtl":
+                material = parts[1] if len(parts) > 1 else None
+            elif tag == "f":
+                position_indexes = []
+                tex_coord_indexes = []
+                normal_indexes = []
+
+                for corner in parts[1:]:
+                    fields = corner.split("/") + ["", ""]
+
+                    position_indexes.append(parseOBJIndex(fields[0], len(positions)))
+                    tex_coord_indexes.append(parseOBJIndex(fields[1], len(tex_coords)))
+                    normal_indexes.append(parseOBJIndex(fields[2], len(normals)))
+
+                if len(position_indexes) < 3:
+                    raise Exception("'{}' has a face with {} corners".format(path, len(position_indexes)))
+
+                mesh.addPolygon(
+                    position_indexes,
+                    None if None in normal_indexes else normal_indexes,
+                    None if None in tex_coord_indexes else tex_coord_indexes,
+                    material)
+
+    mesh.tex_coords = tex_coords
+    mesh.addFrame(positions, normals if len(normals) != 0 else None)
+
+    return mesh
+
+# Every path holds the same mesh in another pose, and each one becomes a frame.
+def loadOBJFrames(paths : list):
+    mesh = loadOBJ(paths[0])
+
+    for path in paths[1:]:
+        pose = loadOBJ(path)
+
+        if len(pose.faces) != len(mesh.faces):
+            raise Exception("'{}' has {} faces but '{}' has {}".format(path, len(pose.faces), paths[0], len(mesh.faces)))
+
+        mesh.addFrame(pose.frames[0], pose.normal_frames[0] if pose.hasNormals() else None)
+
+    if mesh.hasNormals() and len(mesh.normal_frames) != len(mesh.frames):
+        raise Exception("Some of the OBJ frames have normals and some do not")
+
+    return mesh
+
+# glTF
+
+GLB_MAGIC = 0x46546C67
+GLB_JSON_CHUNK = 0x4E4F534A
+GLB_BIN_CHUNK = 0x004E4942
+
+COMPONENT_FORMATS = {5120: "b", 5121: "B", 5122: "h", 5123: "H", 5125: "I", 5126: "f"}
+NORMALIZED_MAXIMUM = {"b": 127.0, "B": 255.0, "h": 32767.0, "H": 65535.0}
+TYPE_WIDTHS = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4}
+
+def readGLB(path : str):
+    with open(path, "rb") as glb_file:
+        data = glb_file.read()
+
+    magic, version, length = struct.unpack_from("<III", data, 0)
+
+    if magic != GLB_MAGIC or version != 2:
+        raise Exception("'{}' is not a version 2 GLB file".format(path))
+
+    document = None
+    binary = None
+    offset = 12
+
+    while offset < min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk_data = data[offset + 8:offset + 8 + chunk_length]
+
+        if chunk_type == GLB_JSON_CHUNK:
+            document = json.loads(chunk_data.decode("utf-8"))
+        elif chunk_type == GLB_BIN_CHUNK and binary is None:
+            binary = chunk_data
+
+        offset += 8 + chunk_length
+
+    if document is None:
+        raise Exception("'{}' has no JSON chunk".format(path))
+
+    return (document, binary)
+
+def loadGLTFBuffer(buffer : dict, directory : str, binary : bytes):
+    uri = buffer.get("uri")
+
+    if uri is None:
+        if binary is None:
+            raise Exception("A glTF buffer has no uri and there is no GLB binary chunk")
+        return binary
+
+    if uri.startswith("data:"):
+        return base64.b64decode(uri[uri.index(",") + 1:])
+
+    with open(os.path.join(directory, urllib.parse.unquote(uri)), "rb") as buffer_file:
+        return buffer_file.read()
+
+# Returns the accessor as a list of tuples, or of numbers for SCALAR accessors.
+def readAccessor(document : dict, buffers : list, index : int):
+    accessor = document["accessors"][index]
+
+    if "sparse" in accessor:
+        raise Exception("Sparse glTF accessors are not supported")
+
+    count = accessor["count"]
+    width = TYPE_WIDTHS[accessor["type"]]
+    component = COMPONENT_FORMATS[accessor["componentType"]]
+
+    if "bufferView" not in accessor:
+        values = [0] * (count * width)
+    else:
+        view = document["bufferViews"][accessor["bufferView"]]
+        data = buffers[view["buffer"]]
+        offset = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+
+        element = struct.Struct("<{}{}".format(width, component))
+        stride = view.get("byteStride", element.size)
+
+        if stride == element.size:
+            values = struct.unpack_from("<{}{}".format(count * width, component), data, offset)
+        else:
+            values = [value for i in range(0, count) for value in element.unpack_from(data, offset + i * stride)]
+
+    if accessor.get("normalized", False) and component in NORMALIZED_MAXIMUM:
+        maximum = NORMALIZED_MAXIMUM[component]
+        values = [max(value / maximum, -1.0) for value in values]
+
+    if width == 1:
+        return list(values)
+
+    return list(zip(*[iter(values)] * width))
+
+def findMorphWeights(document : dict, buffers : list, mesh_index : int, target_amount : int):
+    # The keyframes of a "weights" animation on a node that uses the mesh become the frames.
+    for node_index, node in enumerate(document.get("nodes", [])):
+        if node.get("mesh") != mesh_index:
+            continue
+
+        for animation in document.get("animations", []):
+            for channel in animation.get("channels", []):
+                target = channel.get("target", {})
+
+                if target.get("node") != node_index or target.get("path") != "weights":
+                    continue
+
+                sampler = animation["samplers"][channel["sampler"]]
+                weights = readAccessor(document, buffers, sampler["output"])
+
+                # Cubic spline samplers store an in and out tangent around every value.
+                if sampler.get("interpolation") == "CUBICSPLINE":
+                    weights = [w for k in range(0, len(weights), 3 * target_amount) for w in weights[k + target_amount:k + 2 * target_amount]]
+
+                return [tuple(weights[k:k + target_amount]) for k in range(0, len(weights), target_amount)]
+
+    # Without an animation the rest pose is the first frame and every morph target adds one.
+    frames = [tuple(document["meshes"][mesh_index].get("weights", [0.0] * target_amount))]
+
+    for t in range(0, target_amount):
+        frames.append(tuple(1.0 if i == t else 0.0 for i in range(0, target_amount)))
+
+    return frames
+
+def blendFrame(base : list, deltas : list, weights : tuple):
+    frame = base
+
+    for delta, weight in zip(deltas, weights):
+        if weight != 0.0:
+            frame = [(p[0] + d[0] * weight, p[1] + d[1] * weight, p[2] + d[2] * weight) for p, d in zip(frame, delta)]
+
+    return frame
+
+# Loads every primitive of one mesh of a .gltf or .glb file. Node transforms are not applied.
+def loadGLTF(path : str, mesh_index : int = 0):
+    binary = None
+
+    if path.lower().endswith(".glb"):
+        document, binary = readGLB(path)
+    else:
+        with open(path, "r") as gltf_file:
+            document = json.load(gltf_file)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    buffers = [loadGLTFBuffer(buffer, directory, binary) for buffer in document.get("buffers", [])]
+
+    if mesh_index >= len(document.get("meshes", [])):
+        raise Exception("'{}' has no mesh {}".format(path, mesh_index))
+
+    materials = document.get("materials", [])
+    primitives = document["meshes"][mesh_index]["primitives"]
+    target_amount = len(primitives[0].get("targets", []))
+
+    for primitive in primitives:
+        if len(primitive.get("targets", [])) != target_amount:
+            raise Exception("The primitives of mesh {} in '{}' have different morph target amounts".format(mesh_index, path))
+
+    has_normals = all("NORMAL" in primitive["attributes"] for primitive in primitives)
+
+    base_positions = []
+    base_normals = []
+    position_deltas = [[] for t in range(0, target_amount)]
+    normal_deltas = [[] for t in range(0, target_amount)]
+    mesh = Mesh()
+
+    for primitive in primitives:
+        if primitive.get("mode", 4) != 4:
+            raise Exception("Only triangle primitives are supported, mesh {} in '{}' uses mode {}".format(mesh_index, path, primitive["mode"]))
+
+        attributes = primitive["attributes"]
+        positions = readAccessor(document, buffers, attributes["POSITION"])
+        start = len(base_positions)
+
+        base_positions += positions
+
+        if has_normals:
+            base_normals += readAccessor(document, buffers, attributes["NORMAL"])
+
+        tex_coords = None
+
+        if "TEXCOORD_0" in attributes:
+            tex_coords = readAccessor(document, buffers, attributes["TEXCOORD_0"])
+            tex_start = len(mesh.tex_coords)
+            mesh.tex_coords += tex_coords
+
+        for t, target in enumerate(primitive.get("targets", [])):
+            if "POSITION" in target:
+                position_deltas[t] += readAccessor(document, buffers, target["POSITION"])
+            else:
+                position_deltas[t] += [(0.0, 0.0, 0.0)] * len(positions)
+
+            if has_normals:
+                if "NORMAL" in target:
+                    normal_deltas[t] += readAccessor(document, buffers, target["NORMAL"])
+                else:
+                    normal_deltas[t] += [(0.0, 0.0, 0.0)] * len(positions)
+
+        if "indices" in primitive:
+            indexes = readAccessor(document, buffers, primitive["indices"])
+        else:
+            indexes = list(range(0, len(positions)))
+
+        material = None
+
+        if "material" in primitive:
+            material = materials[primitive["material"]].get("name", str(primitive["material"]))
+
+        for i in range(0, len(indexes) - 2, 3):
+            corners = indexes[i:i + 3]
+
+            mesh.faces.append(MeshFace(
+                [start + c for c in corners],
+                [start + c for c in corners] if has_normals else None,
+                [tex_start + c for c in corners] if tex_coords is not None else None,
+                material))
+
+    for weights in findMorphWeights(document, buffers, mesh_index, target_amount):
+        mesh.addFrame(blendFrame(base_positions, position_deltas, weights), blendFrame(base_normals, normal_deltas, weights) if has_normals else None)
+
+    return mesh
+
+FILE_LOADERS = {
+    ".obj":  loadOBJ,
+    ".gltf": loadGLTF,
+    ".glb":  loadGLTF }
+
+def loadMeshFile(path : str):
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension not in FILE_LOADERS:
+        raise Exception("'{}' is not one of {}".format(path, ", ".join(FILE_LOADERS)))
+
+    with Profiling.span("mesh.load"):
+        return FILE_LOADERS[extension](path)
+
+# Welding
+
+def toFixed(value : float, scale : float):
+    fixed = int(round(value * scale))
+
+    if fixed < -0x8000 or fixed > 0x7FFF:
+        raise Exception("{} times the scale {} is {} which does not fit 16 bits".format(value, scale, fixed))
+
+    return fixed
+
+def toFixedNormal(normal : tuple):
+    length = math.sqrt(normal[0] * normal[0] + normal[1] * normal[1] + normal[2] * normal[2])
+
+    if length == 0.0:
+        return (NORMAL_ONE, 0, 0)
+
+    return (int(round(normal[0] / length * NORMAL_ONE)), int(round(normal[1] / length * NORMAL_ONE)), int(round(normal[2] / length * NORMAL_ONE)))
+
+def getFaceNormal(a : tuple, b : tuple, c : tuple):
+    u = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+    v = (c[0] - a[0], c[1] - a[1], c[2] - a[2])
+
+    return toFixedNormal((u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0]))
+
+# Merges the keys that are equal, or within weld_distance on every axis of every frame.
+# Returns (unique keys, the index into them for every key).
+def weldKeys(keys : list, weld_distance : int = 0):
+    unique = []
+    remap = []
+
+    if weld_distance <= 0:
+        found = {}
+
+        for key in keys:
+            index = found.get(key)
+
+            if index is None:
+                index = len(unique)
+                found[key] = index
+                unique.append(key)
+
+            remap.append(index)
+
+        return (unique, remap)
+
+    # Spatial hash on the first frame. A key can only match a key in its own cell or the 26 around it.
+    cells = {}
+
+    for key in keys:
+        cell = (key[0][0] // weld_distance, key[0][1] // weld_distance, key[0][2] // weld_distance)
+        index = None
+
+        for x in range(cell[0] - 1, cell[0] + 2):
+            for y in range(cell[1] - 1, cell[1] + 2):
+                for z in range(cell[2] - 1, cell[2] + 2):
+                    for candidate in cells.get((x, y, z), ()):
+                        if all(abs(a[c] - b[c]) <= weld_distance for a, b in zip(key, unique[candidate]) for c in range(0, 3)):
+                            index = candidate
+                            break
+
+                    if index is not None:
+                        break
+                if index is not None:
+                    break
+            if index is not None:
+                break
+
+        if index is None:
+            index = len(unique)
+            unique.append(key)
+            cells.setdefault(cell, []).append(index)
+
+        remap.append(index)
+
+    return (unique, remap)
+
+class WeldedMesh:
+    def __init__(self):
+        self.vertices = [] # Every vertex is a tuple of its fixed point position in every frame.
+        self.normals = []  # Every normal is a tuple of its fixed point direction in every frame.
+        self.faces = []    # Every face is (position indexes, normal indexes, face type key).
+
+    def getFrameAmount(self):
+        if len(self.vertices) == 0:
+            return 1
+        return len(self.vertices[0])
+
+def toTexCoord(value : float):
+    return min(max(int(round(value * 255.0)), 0), 255)
+
+# bmp_ids and colors map material names to the BMP ID of textured faces and the vertex color of the others.
+def getFaceTypeKey(mesh : Mesh, face : MeshFace, bmp_ids : dict, colors : dict):
+    if face.tex_coord_indexes is None:
+        return (None, 0, colors.get(face.material, (255, 255, 255)))
+
+    corners = [mesh.tex_coords[i] for i in face.tex_coord_indexes]
+
+    # A triangle repeats its last corner as the fourth.
+    if len(corners) == 3:
+        corners.append(corners[2])
+
+    return (tuple((toTexCoord(u), toTexCoord(v)) for u, v in corners), bmp_ids.get(face.material, 0), None)
+
+def weldMesh(mesh : Mesh, scale : float = DEFAULT_SCALE, weld_distance : int = 0, bmp_ids : dict = None, colors : dict = None):
+    if bmp_ids is None:
+        bmp_ids = {}
+
+    if colors is None:
+        colors = {}
+
+    welded = WeldedMesh()
+
+    with Profiling.span("mesh.weld"):
+        fixed_frames = [[(toFixed(p[0], scale), toFixed(p[1], scale), toFixed(p[2], scale)) for p in frame] for frame in mesh.frames]
+
+        welded.vertices, vertex_remap = weldKeys(list(zip(*fixed_frames)), weld_distance)
+
+        normal_keys = []
+
+        if mesh.hasNormals():
+            normal_keys = list(zip(*[[toFixedNormal(n) for n in frame] for frame in mesh.normal_frames]))
+
+        face_normal_indexes = []
+
+        for face in mesh.faces:
+            if face.normal_indexes is not None:
+                face_normal_indexes.append(face.normal_indexes)
+                continue
+
+            # Faces without normals get their own flat normal, computed in every frame.
+            face_normal_indexes.append([len(normal_keys)] * len(face.position_indexes))
+            normal_keys.append(tuple(getFaceNormal(*[frame[i] for i in face.position_indexes[:3]]) for frame in mesh.frames))
+
+        welded.normals, normal_remap = weldKeys(normal_keys)
+
+        for face, normal_indexes in zip(mesh.faces, face_normal_indexes):
+            welded.faces.append((
+                [vertex_remap[i] for i in face.position_indexes],
+                [normal_remap[i] for i in normal_indexes],
+                getFaceTypeKey(mesh, face, bmp_ids, colors)))
+
+    return welded
+
+def makeFaceType(key : tuple):
+    face_type = COBJBuilder.FaceType()
+
+    tex_coords, bmp_id, color = key
+
+    if tex_coords is None:
+        face_type.setVertexColor(True, color)
+    else:
+        face_type.setTexCoords(True, tex_coords)
+        face_type.setBMPID(bmp_id)
+
+    return face_type
+
+# Builds a Model out of faces, all of welded when faces is None.
+# Only the vertices and normals the faces use are written, so a subset of the faces gives a smaller Model.
+def makeModel(welded : WeldedMesh, faces : list = None):
+    if faces is None:
+        faces = welded.faces
+
+    with Profiling.span("mesh.build"):
+        vertex_indexes = {}
+        normal_indexes = {}
+        face_type_indexes = {}
+
+        for positions, normals, face_type_key in faces:
+            for i in positions:
+                vertex_indexes.setdefault(i, len(vertex_indexes))
+            for i in normals:
+                normal_indexes.setdefault(i, len(normal_indexes))
+            face_type_indexes.setdefault(face_type_key, len(face_type_indexes))
+
+        if len(vertex_indexes) > INDEX_LIMIT:
+            raise Exception("The mesh has {} vertices after welding, which is more than the limit of {}. MeshSplitter can split it".format(len(vertex_indexes), INDEX_LIMIT))
+
+        if len(normal_indexes) > INDEX_LIMIT:
+            raise Exception("The mesh has {} normals after welding, which is more than the limit of {}. MeshSplitter can split it".format(len(normal_indexes), INDEX_LIMIT))
+
+        model = COBJBuilder.Model()
+
+        for face_type_key in face_type_indexes:
+            face_type_indexes[face_type_key] = model.internFaceType(makeFaceType(face_type_key))
+
+        for positions, normals, face_type_key in faces:
+            primitive = COBJBuilder.Primitive()
+
+            if len(positions) == 3:
+                primitive.setTypeTriangle([vertex_indexes[i] for i in positions], [normal_indexes[i] for i in normals])
+            else:
+                primitive.setTypeQuad([vertex_indexes[i] for i in positions], [normal_indexes[i] for i in normals])
+
+            primitive.setFaceTypeIndex(face_type_indexes[face_type_key])
+            primitive.setTexture(face_type_key[0] is not None)
+
+            model.appendPrimitive(primitive)
+
+        frame_amount = welded.getFrameAmount()
+        vertices = [welded.vertices[i] for i in vertex_indexes]
+        normals = [welded.normals[i] for i in normal_indexes]
+
+        model.allocateVertexBuffers(frame_amount, len(vertices), len(normals), 0, 0, 0)
+
+        for f in range(0, frame_amount):
+            model.getPositionBuffer(f).setValues([vertex[f] for vertex in vertices])
+            model.getNormalBuffer(f).setValues([normal[f] for normal in normals])
+
+    return model
+
+def importMesh(mesh : Mesh, scale : float = DEFAULT_SCALE, weld_distance : int = 0, bmp_ids : dict = None, colors : dict = None):
+    return makeModel(weldMesh(mesh, scale, weld_distance, bmp_ids, colors))
+
+def importMeshFile(path : str, scale : float = DEFAULT_SCALE, weld_distance : int = 0, bmp_ids : dict = None, colors : dict = None):
+    return importMesh(loadMeshFile(path), scale, weld_distance, bmp_ids, colors)
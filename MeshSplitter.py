@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import heapq
+import sys
+
+import COBJBuilder
+import MeshImporter
+import Profiling
+
+# Splits a welded mesh that is too big for one Model into parts that each stay under the index limits.
+# A part grows from a seed face over shared vertices, always taking the neighbouring face that adds the fewest
+# new vertices and normals. Faces that reuse what the part already holds go first, so parts stay compact and
+# few vertices end up duplicated along the borders between them.
+
+# The seed of a new part is the unassigned face that comes first along the longest axis of the mesh,
+# so the parts sweep across the mesh instead of starting in random places.
+def getSeedOrder(welded : MeshImporter.WeldedMesh):
+    if len(welded.vertices) == 0:
+        return list(range(0, len(welded.faces)))
+
+    axis_ranges = [max(v[0][c] for v in welded.vertices) - min(v[0][c] for v in welded.vertices) for c in range(0, 3)]
+    axis = axis_ranges.index(max(axis_ranges))
+
+    return sorted(range(0, len(welded.faces)), key = lambda f: min(welded.vertices[i][0][axis] for i in welded.faces[f][0]))
+
+# Returns a list of parts, each a list of indexes into welded.faces.
+def partitionFaces(welded : MeshImporter.WeldedMesh, vertex_limit : int = MeshImporter.INDEX_LIMIT, normal_limit : int = MeshImporter.INDEX_LIMIT):
+    faces = welded.faces
+
+    for f in range(0, len(faces)):
+        if len(set(faces[f][0])) > vertex_limit or len(set(faces[f][1])) > normal_limit:
+            raise Exception("Face {} alone needs more indexes than the limits allow".format(f))
+
+    with Profiling.span("mesh.partition"):
+        vertex_faces = {}
+
+        for f in range(0, len(faces)):
+            for i in faces[f][0]:
+                vertex_faces.setdefault(i, []).append(f)
+
+        assigned = [False] * len(faces)
+        seed_order = getSeedOrder(welded)
+        next_seed = 0
+        first_unassigned = 0
+        parts = []
+
+        while next_seed < len(seed_order):
+            part = []
+            vertices = set()
+            normals = set()
+            rejected = set()
+            heap = []
+
+            center = None
+
+            # Ties go to the face nearest the seed of the part, which keeps parts round instead of long strips.
+            def getCost(f):
+                position = welded.vertices[faces[f][0][0]][0]
+                distance = (position[0] - center[0]) ** 2 + (position[1] - center[1]) ** 2 + (position[2] - center[2]) ** 2
+
+                return (len(set(faces[f][0]) - vertices) + len(set(faces[f][1]) - normals), distance)
+
+            while True:
+                face_index = None
+
+                # Take the cheapest neighbour. Costs only drop while a part grows, so a stale entry is pushed back with its new cost.
+                while len(heap) != 0:
+                    cost, distance, f = heapq.heappop(heap)
+
+                    if assigned[f] or f in rejected:
+                        continue
+
+                    new_cost, distance = getCost(f)
+
+                    if new_cost != cost:
+                        heapq.heappush(heap, (new_cost, distance, f))
+                        continue
+
+                    face_index = f
+                    break
+
+                # Without a neighbour left, start a new region of this part from the next seed.
+                from_seed = face_index is None
+
+                if from_seed:
+                    while next_seed < len(seed_order) and (assigned[seed_order[next_seed]] or seed_order[next_seed] in rejected):
+                        next_seed += 1
+
+                    if next_seed == len(seed_order):
+                        break
+
+                    face_index = seed_order[next_seed]
+
+                    if center is None:
+                        center = welded.vertices[faces[face_index][0][0]][0]
+
+                new_vertices = set(faces[face_index][0]) - vertices
+                new_normals = set(faces[face_index][1]) - normals
+
+                if len(vertices) + len(new_vertices) > vertex_limit or len(normals) + len(new_normals) > normal_limit:
+                    # A neighbour that does not fit leaves room for others, but a new region that does not fit means the part is full.
+                    if from_seed:
+                        break
+
+                    rejected.add(face_index)
+                    continue
+
+                assigned[face_index] = True
+                part.append(face_index)
+                vertices |= new_vertices
+                normals |= new_normals
+
+                for i in new_vertices:
+                    for f in vertex_faces[i]:
+                        if not assigned[f]:
+                            heapq.heappush(heap, getCost(f) + (f,))
+
+            parts.append(part)
+
+            # Faces rejected by this part may still start the next one.
+            while first_unassigned < len(seed_order) and assigned[seed_order[first_unassigned]]:
+                first_unassigned += 1
+
+            next_seed = first_unassigned
+
+    return parts
+
+# Returns a WeldedMesh for every part that holds only the vertices and normals the part uses.
+def splitWeldedMesh(welded : MeshImporter.WeldedMesh, vertex_limit : int = MeshImporter.INDEX_LIMIT, normal_limit : int = MeshImporter.INDEX_LIMIT):
+    pieces = []
+
+    for part in partitionFaces(welded, vertex_limit, normal_limit):
+        piece = MeshImporter.WeldedMesh()
+        vertex_indexes = {}
+        normal_indexes = {}
+
+        for f in part:
+            positions, normals, face_type_key = welded.faces[f]
+
+            for i in positions:
+                if i not in vertex_indexes:
+                    vertex_indexes[i] = len(piece.vertices)
+                    piece.vertices.append(welded.vertices[i])
+
+            for i in normals:
+                if i not in normal_indexes:
+                    normal_indexes[i] = len(piece.normals)
+                    piece.normals.append(welded.normals[i])
+
+            piece.faces.append(([vertex_indexes[i] for i in positions], [normal_indexes[i] for i in normals], face_type_key))
+
+        pieces.append(piece)
+
+    return pieces
+
+# export_options are the keyword arguments of Model.makeFile, like deduplicate_buffers.
+# normals is "smooth" or "faceted" to replace the normals of the part with NormalGenerator, or None to keep them.
+# Returns the path and the ModelOptimizer.OptimizeReport of the part, which is None without optimize.
+def writePiece(piece : MeshImporter.WeldedMesh, filepath : str, model_format : COBJBuilder.ModelFormat, export_options : dict, optimize : bool = False, normals : str = None):
+    model = MeshImporter.makeModel(piece)
+    report = None
+
+    if normals is not None:
+        import NormalGenerator
+
+        NormalGenerator.generateNormals(model, normals == "smooth")
+
+    if optimize:
+        import ModelOptimizer
+
+        report = ModelOptimizer.optimizeModel(model)
+
+    model.makeFile(filepath, model_format, **export_options)
+
+    return (filepath, report)
+
+# Builds one Model per part. With processes other than 1 the parts are built on a process pool.
+def splitMesh(welded : MeshImporter.WeldedMesh, processes : int = None):
+    pieces = splitWeldedMesh(welded)
+
+    if processes == 1 or len(pieces) < 2:
+        return [MeshImporter.makeModel(piece) for piece in pieces]
+
+    import concurrent.futures
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(MeshImporter.makeModel, pieces))
+
+# output_path_format is formatted with the part index, for example "models/hull_{}.cobj".
+# optimize runs ModelOptimizer on every part and prints its report to stderr, normals is passed on to writePiece.
+# Returns the paths that were written.
+def writeSplitMesh(welded : MeshImporter.WeldedMesh, output_path_format : str, model_format : COBJBuilder.ModelFormat, processes : int = None, optimize : bool = False, normals : str = None, **export_options):
+    if normals is not None and normals not in ("smooth", "faceted"):
+        raise Exception("Unknown normals '{}'. Use smooth or faceted".format(normals))
+
+    pieces = splitWeldedMesh(welded)
+    paths = [output_path_format.format(index) for index in range(0, len(pieces))]
+
+    if processes == 1 or len(pieces) < 2:
+        results = [writePiece(piece, path, model_format, export_options, optimize, normals) for piece, path in zip(pieces, paths)]
+    else:
+        import concurrent.futures
+
+        with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(writePiece, pieces, paths, [model_format] * len(pieces), [export_options] * len(pieces), [optimize] * len(pieces), [normals] * len(pieces)))
+
+    for path, report in results:
+        if report is not None:
+            print("{}: {}".format(path, report), file = sys.stderr)
+
+    return [path for path, report in results]
@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import copy
+import heapq
+
+import COBJBuilder
+import ModelOptimizer
+import Profiling
+
+# Makes lighter copies of a Model by collapsing edges of its triangles and quads, cheapest first.
+# Every collapse moves one vertex onto a neighbour that stays where it is in every frame, so the position buffers
+# of a morph animation never need new positions and every frame stays valid. The cost of a collapse is the
+# quadric error of the planes around both vertices summed over all frames.
+# A vertex is only moved when all faces around it share one face type material and texture coordinates,
+# so texture seams, FaceType boundaries and open borders of the mesh stay where they are.
+
+TRIANGLE = COBJBuilder.PrimitivePolygonType.TRIANGLE
+QUAD = COBJBuilder.PrimitivePolygonType.QUAD
+
+# How many of the first vertex_index entries of a primitive are positions.
+POSITION_SLOTS = {
+    COBJBuilder.PrimitivePolygonType.STAR: 1,
+    COBJBuilder.PrimitivePolygonType.BILLBOARD: 1,
+    COBJBuilder.PrimitivePolygonType.LINE: 2,
+    TRIANGLE: 3,
+    QUAD: 4 }
+
+def cross(u : tuple, v : tuple):
+    return (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+
+def getNormal(frame : list, corners : list):
+    a = frame[corners[0]]
+    b = frame[corners[1]]
+    c = frame[corners[2]]
+    d = frame[corners[-1]] if len(corners) == 4 else a
+
+    # The cross product of the diagonals, which is the one of two edges for a triangle.
+    return cross((c[0] - a[0], c[1] - a[1], c[2] - a[2]), (d[0] - b[0], d[1] - b[1], d[2] - b[2]))
+
+# Returns the plane quadric of the triangle a, b, c weighted by its area as (aa, ab, ac, ad, bb, bc, bd, cc, cd, dd).
+def getPlaneQuadric(a : tuple, b : tuple, c : tuple):
+    n = cross((b[0] - a[0], b[1] - a[1], b[2] - a[2]), (c[0] - a[0], c[1] - a[1], c[2] - a[2]))
+    length = (n[0] * n[0] + n[1] * n[1] + n[2] * n[2]) ** 0.5
+
+    if length == 0.0:
+        return (0.0,) * 10
+
+    d = -(n[0] * a[0] + n[1] * a[1] + n[2] * a[2])
+    weight = 0.5 / length
+
+    return (n[0] * n[0] * weight, n[0] * n[1] * weight, n[0] * n[2] * weight, n[0] * d * weight,
+            n[1] * n[1] * weight, n[1] * n[2] * weight, n[1] * d * weight,
+            n[2] * n[2] * weight, n[2] * d * weight,
+            d * d * weight)
+
+def evaluateQuadric(q : list, p : tuple):
+    x, y, z = p
+
+    return (q[0] * x * x + 2.0 * q[1] * x * y + 2.0 * q[2] * x * z + 2.0 * q[3] * x
+          + q[4] * y * y + 2.0 * q[5] * y * z + 2.0 * q[6] * y
+          + q[7] * z * z + 2.0 * q[8] * z
+          + q[9])
+
+class DecimateFace:
+    def __init__(self, primitive_index : int, primitive : COBJBuilder.Primitive, face_type : COBJBuilder.FaceType):
+        corner_amount = POSITION_SLOTS[primitive.getPolygonType()]
+
+        self.primitive_index = primitive_index
+        self.corners = primitive.vertex_index[:corner_amount]
+        self.normals = primitive.normal_index[:corner_amount]
+        self.uvs = None
+        self.alive = True
+
+        if face_type.hasTexCoords():
+            self.uvs = [tuple(corner) for corner in face_type.texCoordFrames[0][:corner_amount]]
+
+        # Faces with the same material may share vertices that move, which keeps every FaceType boundary in place.
+        if face_type.hasTexCoordAnimation():
+            self.material = (primitive.texture, primitive.bitfield, primitive.reflective, primitive.face_type_index)
+        elif face_type.hasTexCoords():
+            self.material = (primitive.texture, primitive.bitfield, primitive.reflective, tuple(face_type.opcodes), face_type.bmp_id)
+        else:
+            self.material = (primitive.texture, primitive.bitfield, primitive.reflective, face_type.getKey())
+
+        self.changed = False
+
+    def getUV(self, vertex : int):
+        return self.uvs[self.corners.index(vertex)]
+
+    # True when a and b follow each other around the face.
+    def hasEdge(self, a : int, b : int):
+        i = self.corners.index(a)
+        n = len(self.corners)
+
+        return self.corners[(i + 1) % n] == b or self.corners[(i - 1) % n] == b
+
+class Decimator:
+    def __init__(self, model : COBJBuilder.Model):
+        self.model = model
+        self.faces = []
+        self.other_primitive_amount = 0
+
+        # Frames that share a position buffer are the same frame to the decimator.
+        vertex_ids = []
+
+        for buffer_id_frame in model.buffer_id_frames:
+            if buffer_id_frame.getVertexBufferID() not in vertex_ids:
+                vertex_ids.append(buffer_id_frame.getVertexBufferID())
+
+        self.frames = [model.vertex_buffer_ids[vertex_id].vector for vertex_id in vertex_ids]
+        vertex_amount = len(self.frames[0])
+
+        self.locked = [False] * vertex_amount
+        self.vertex_faces = [set() for i in range(0, vertex_amount)]
+
+        for index, primitive in enumerate(model.primitives):
+            if primitive.getPolygonType() == TRIANGLE or primitive.getPolygonType() == QUAD:
+                face = DecimateFace(index, primitive, model.getFaceType(primitive.face_type_index))
+
+                for vertex in face.corners:
+                    self.vertex_faces[vertex].add(len(self.faces))
+
+                self.faces.append(face)
+            else:
+                self.other_primitive_amount += 1
+
+                for vertex in primitive.vertex_index[:POSITION_SLOTS[primitive.getPolygonType()]]:
+                    self.locked[vertex] = True
+
+        self.face_amount = len(self.faces)
+
+        with Profiling.span("decimate.quadrics"):
+            self.lockBorders()
+            self.quadrics = [self.getVertexQuadrics(frame) for frame in self.frames]
+
+        self.versions = [0] * vertex_amount
+        self.heap = []
+        self.fillHeap()
+
+    def fillHeap(self):
+        self.heap = []
+
+        for face in self.faces:
+            if face.alive:
+                for i in range(0, len(face.corners)):
+                    self.pushEdge(face.corners[i], face.corners[(i + 1) % len(face.corners)])
+
+    # An edge of only one face is an open border of the mesh, its vertices stay where they are.
+    def lockBorders(self):
+        edges = {}
+
+        for face in self.faces:
+            for i in range(0, len(face.corners)):
+                edge = (face.corners[i], face.corners[(i + 1) % len(face.corners)])
+                edge = (min(edge), max(edge))
+                edges[edge] = edges.get(edge, 0) + 1
+
+        for edge, amount in edges.items():
+            if amount == 1:
+                self.locked[edge[0]] = True
+                self.locked[edge[1]] = True
+
+    # Returns the summed quadric of every vertex in one frame, a quad counts as two triangles.
+    def getVertexQuadrics(self, frame : list):
+        triangles = [(f.corners[0], f.corners[1], f.corners[2]) for f in self.faces]
+        triangles += [(f.corners[0], f.corners[2], f.corners[3]) for f in self.faces if len(f.corners) == 4]
+
+        planes = [getPlaneQuadric(frame[a], frame[b], frame[c]) for a, b, c in triangles]
+        quadrics = [[0.0] * 10 for i in range(0, len(frame))]
+
+        for triangle, plane in zip(triangles, planes):
+            for vertex in triangle:
+                total = quadrics[vertex]
+
+                for i in range(0, 10):
+                    total[i] += plane[i]
+
+        return quadrics
+
+    def getPrimitiveAmount(self):
+        return self.face_amount + self.other_primitive_amount
+
+    def pushEdge(self, a : int, b : int):
+        for u, v in ((a, b), (b, a)):
+            if not self.locked[u]:
+                heapq.heappush(self.heap, (self.getCost(u, v), self.versions[u], self.versions[v], u, v))
+
+    def getCost(self, u : int, v : int):
+        cost = 0.0
+
+        for frame, quadrics in zip(self.frames, self.quadrics):
+            q_u = quadrics[u]
+            q_v = quadrics[v]
+            cost += evaluateQuadric([q_u[i] + q_v[i] for i in range(0, 10)], frame[v])
+
+        return cost
+
+    def getNeighbours(self, vertex : int):
+        neighbours = set()
+
+        for f in self.vertex_faces[vertex]:
+            corners = self.faces[f].corners
+            i = corners.index(vertex)
+            neighbours.add(corners[(i + 1) % len(corners)])
+            neighbours.add(corners[(i - 1) % len(corners)])
+
+        return neighbours
+
+    # Returns the texture coordinate v gets in the faces around u, False when moving u onto v is not allowed.
+    def checkCollapse(self, u : int, v : int):
+        faces_u = [self.faces[f] for f in self.vertex_faces[u]]
+        shared = [face for face in faces_u if v in face.corners]
+
+        if len(shared) == 0:
+            return False
+
+        if any(face.material != faces_u[0].material for face in faces_u):
+            return False
+
+        # u and v on opposite corners of a quad would fold it.
+        if any(not face.hasEdge(u, v) for face in shared):
+            return False
+
+        # The only vertices next to both may be the third corners of the triangles that lose the edge, or the mesh pinches.
+        shared_triangles = [face for face in shared if len(face.corners) == 3]
+
+        if len(self.getNeighbours(u) & self.getNeighbours(v)) > len(shared_triangles):
+            return False
+
+        uv = None
+
+        if faces_u[0].uvs is not None:
+            if any(face.getUV(u) != faces_u[0].getUV(u) for face in faces_u):
+                return False
+
+            uv = shared[0].getUV(v)
+
+            if any(face.getUV(v) != uv for face in shared):
+                return False
+
+        # No face that keeps its area may turn over in any frame.
+        for face in faces_u:
+            if face in shared_triangles:
+                continue
+
+            if face in shared:
+                corners = [c for c in face.corners if c != u]
+            else:
+                corners = [v if c == u else c for c in face.corners]
+
+            for frame in self.frames:
+                before = getNormal(frame, face.corners)
+                after = getNormal(frame, corners)
+
+                if before[0] * after[0] + before[1] * after[1] + before[2] * after[2] <= 0:
+                    return False
+
+        return (uv,)
+
+    def collapse(self, u : int, v : int, uv : tuple):
+        for f in list(self.vertex_faces[u]):
+            face = self.faces[f]
+            i = face.corners.index(u)
+            face.changed = True
+
+            if v in face.corners:
+                if len(face.corners) == 3:
+                    face.alive = False
+                    self.face_amount -= 1
+
+                    for vertex in face.corners:
+                        self.vertex_faces[vertex].discard(f)
+                    continue
+
+                # A quad that loses an edge becomes a triangle.
+                del face.corners[i]
+                del face.normals[i]
+
+                if face.uvs is not None:
+                    del face.uvs[i]
+            else:
+                face.corners[i] = v
+
+                if face.uvs is not None:
+                    face.uvs[i] = uv
+
+                self.vertex_faces[v].add(f)
+
+        self.vertex_faces[u] = set()
+
+        for quadrics in self.quadrics:
+            q_u = quadrics[u]
+            q_v = quadrics[v]
+
+            for i in range(0, 10):
+                q_v[i] += q_u[i]
+
+        # Every collapse onto or from v has a new cost now.
+        self.versions[u] += 1
+        self.versions[v] += 1
+
+        for w in self.getNeighbours(v):
+            self.pushEdge(v, w)
+
+    # Collapses the cheapest edges until at most primitive_budget primitives are left or nothing can collapse.
+    def reduce(self, primitive_budget : int):
+        collapsed = False
+
+        while self.getPrimitiveAmount() > primitive_budget:
+            # A collapse that was not allowed when it came up may be allowed after the ones that followed it.
+            if len(self.heap) == 0:
+                if not collapsed:
+                    break
+
+                self.fillHeap()
+                collapsed = False
+
+                # Every vertex left is locked, so this is the lightest model that keeps seams and borders.
+                if len(self.heap) == 0:
+                    break
+
+            cost, version_u, version_v, u, v = heapq.heappop(self.heap)
+
+            if version_u != self.versions[u] or version_v != self.versions[v] or len(self.vertex_faces[u]) == 0:
+                continue
+
+            result = self.checkCollapse(u, v)
+
+            if result is False:
+                continue
+
+            self.collapse(u, v, result[0])
+            collapsed = True
+
+    # Returns a copy of the model with the faces as they are now and only the positions and normals they use.
+    def makeModel(self):
+        model = copy.deepcopy(self.model)
+        faces = {face.primitive_index: face for face in self.faces}
+        primitives = []
+
+        for index, primitive in enumerate(model.primitives):
+            face = faces.get(index)
+
+            if face is None:
+                primitives.append(primitive)
+                continue
+
+            if not face.alive:
+                continue
+
+            if face.changed:
+                if len(face.corners) == 3:
+                    primitive.setTypeTriangle(face.corners, face.normals)
+                else:
+                    primitive.setTypeQuad(face.corners, face.normals)
+
+                if face.uvs is not None:
+                    face_type = copy.deepcopy(model.getFaceType(primitive.face_type_index))
+                    uvs = list(face.uvs)
+
+                    # A triangle repeats its last corner as the fourth.
+                    if len(uvs) == 3:
+                        uvs.append(uvs[2])
+
+                    face_type.setTexCoords(True, tuple(uvs))
+                    primitive.setFaceTypeIndex(model.internFaceType(face_type))
+
+            primitives.append(primitive)
+
+        model.primitives = primitives
+        ModelOptimizer.removeUnusedFaceTypes(model, ModelOptimizer.getUsedFaceTypes(self.model))
+        compactBuffers(model)
+
+        return model
+
+# Drops the positions and normals no primitive uses from every buffer and renumbers the primitives.
+def compactBuffers(model : COBJBuilder.Model):
+    used_positions = sorted(set(i for p in model.primitives for i in p.vertex_index[:POSITION_SLOTS[p.getPolygonType()]]))
+    position_indexes = {old: new for new, old in enumerate(used_positions)}
+
+    for buffer in model.vertex_buffer_ids.values():
+        buffer.vector = [buffer.vector[i] for i in used_positions]
+
+    for p in model.primitives:
+        amount = POSITION_SLOTS[p.getPolygonType()]
+        p.vertex_index[:amount] = [position_indexes[i] for i in p.vertex_index[:amount]]
+
+    # Billboards and lines always point at normal 0, so the normals are only compacted without them.
+    if any(p.getPolygonType() != TRIANGLE and p.getPolygonType() != QUAD for p in model.primitives):
+        return
+
+    used_normals = sorted(set(i for p in model.primitives for i in p.normal_index[:POSITION_SLOTS[p.getPolygonType()]]))
+    normal_indexes = {old: new for new, old in enumerate(used_normals)}
+
+    for buffer in model.normal_buffer_ids.values():
+        buffer.vector = [buffer.vector[i] for i in used_normals]
+
+    for p in model.primitives:
+        amount = POSITION_SLOTS[p.getPolygonType()]
+        p.normal_index[:amount] = [normal_indexes[i] for i in p.normal_index[:amount]]
+
+# Returns one Model for every primitive budget, from the largest budget to the smallest. Every model is decimated
+# further from the one before it. A budget that cannot be reached without moving a seam or border gives the
+# lightest model that keeps them.
+def makeLODChain(model : COBJBuilder.Model, primitive_budgets : list):
+    decimator = Decimator(model)
+    models = []
+
+    for budget in sorted(primitive_budgets, reverse = True):
+        with Profiling.span("decimate.reduce"):
+            decimator.reduce(budget)
+
+        models.append(decimator.makeModel())
+
+    return models
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import math
+
+import COBJBuilder
+import Profiling
+
+# Reduces the primitives of a Model, every one of which costs a 12 byte 3DQL record and a draw.
+# Degenerate and duplicate primitives are removed, then pairs of triangles that share an edge, a material
+# and a plane are merged into quads. Triangles are paired through an index of their edges, so nothing
+# compares every primitive with every other one.
+
+TRIANGLE = COBJBuilder.PrimitivePolygonType.TRIANGLE
+QUAD = COBJBuilder.PrimitivePolygonType.QUAD
+
+def getCorners(primitive : COBJBuilder.Primitive):
+    if primitive.getPolygonType() == TRIANGLE:
+        return 3
+    return 4
+
+def getFrames(model : COBJBuilder.Model):
+    return [model.getPositionBuffer(f).vector for f in range(0, len(model.buffer_id_frames))]
+
+def cross(a : tuple, b : tuple, c : tuple):
+    u = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+    v = (c[0] - a[0], c[1] - a[1], c[2] - a[2])
+
+    return (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+
+def dot(a : tuple, b : tuple):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def length(a : tuple):
+    return math.sqrt(dot(a, a))
+
+# Everything but the corners that makes two primitives draw the same way.
+def getMaterialKey(primitive : COBJBuilder.Primitive):
+    return (primitive.getPolygonType(), primitive.texture, primitive.bitfield, primitive.reflective, primitive.face_type_index)
+
+# Turns the corners so the smallest vertex index comes first, which keeps the winding.
+def getCornerKey(primitive : COBJBuilder.Primitive):
+    corners = list(zip(primitive.vertex_index[:getCorners(primitive)], primitive.normal_index[:getCorners(primitive)]))
+    first = corners.index(min(corners))
+
+    return tuple(corners[first:] + corners[:first])
+
+def isDegenerate(primitive : COBJBuilder.Primitive, frames : list):
+    indexes = primitive.vertex_index[:getCorners(primitive)]
+
+    if len(set(indexes)) != len(indexes):
+        return True
+
+    # A primitive is flat only if it has no area in every frame.
+    for frame in frames:
+        positions = [frame[i] for i in indexes]
+
+        if cross(positions[0], positions[1], positions[2]) != (0, 0, 0):
+            return False
+
+        if len(positions) == 4 and cross(positions[0], positions[2], positions[3]) != (0, 0, 0):
+            return False
+
+    return True
+
+class OptimizeReport:
+    def __init__(self):
+        self.before = 0
+        self.after = 0
+        self.degenerate = 0
+        self.duplicate = 0
+        self.merged = 0
+
+    def toDictionary(self):
+        return {
+            "before": self.before,
+            "after": self.after,
+            "degenerate": self.degenerate,
+            "duplicate": self.duplicate,
+            "merged": self.merged }
+
+    def __str__(self):
+        return "{} primitives became {}: {} degenerate, {} duplicate and {} triangle pairs merged into quads".format(
+            self.before, self.after, self.degenerate, self.duplicate, self.merged)
+
+def removeDegenerateAndDuplicates(model : COBJBuilder.Model, report : OptimizeReport):
+    frames = getFrames(model)
+    seen = set()
+    primitives = []
+
+    for primitive in model.primitives:
+        poly_type = primitive.getPolygonType()
+
+        if poly_type == TRIANGLE or poly_type == QUAD:
+            if isDegenerate(primitive, frames):
+                report.degenerate += 1
+                continue
+
+            key = (getMaterialKey(primitive), getCornerKey(primitive))
+        elif poly_type == COBJBuilder.PrimitivePolygonType.STAR:
+            # Stars carry animation data of their own, so they are always kept.
+            primitives.append(primitive)
+            continue
+        else:
+            key = (getMaterialKey(primitive), tuple(primitive.vertex_index), tuple(primitive.normal_index))
+
+        if key in seen:
+            report.duplicate += 1
+            continue
+
+        seen.add(key)
+        primitives.append(primitive)
+
+    model.primitives = primitives
+
+# Returns the corners of the quad made by triangles first and second sharing the edge first goes along from a to b,
+# or None when the triangles do not form a flat convex quad in every frame.
+def getMergedCorners(first : COBJBuilder.Primitive, second : COBJBuilder.Primitive, edge : int, frames : list, minimum_cosine : float):
+    a = first.vertex_index[edge]
+    b = first.vertex_index[(edge + 1) % 3]
+    c = first.vertex_index[(edge + 2) % 3]
+
+    second_corners = second.vertex_index[:3]
+
+    # The second triangle has to run the shared edge the other way, from b to a, or the windings disagree.
+    second_b = second_corners.index(b)
+
+    if second_corners[(second_b + 1) % 3] != a:
+        return None
+
+    d_corner = (second_b + 2) % 3
+    d = second_corners[d_corner]
+
+    # A corner shared by both triangles needs the same normal in both.
+    if first.normal_index[edge] != second.normal_index[(second_b + 1) % 3]:
+        return None
+
+    if first.normal_index[(edge + 1) % 3] != second.normal_index[second_b]:
+        return None
+
+    for frame in frames:
+        first_normal = cross(frame[a], frame[b], frame[c])
+        second_normal = cross(frame[b], frame[a], frame[d])
+
+        if dot(first_normal, second_normal) < minimum_cosine * length(first_normal) * length(second_normal):
+            return None
+
+        # Going around b, c, a, d every turn has to bend the same way as the plane, or the quad is concave.
+        quad = [frame[b], frame[c], frame[a], frame[d]]
+
+        for i in range(0, 4):
+            if dot(cross(quad[i], quad[(i + 1) % 4], quad[(i + 2) % 4]), first_normal) <= 0:
+                return None
+
+    normals = [first.normal_index[(edge + 1) % 3], first.normal_index[(edge + 2) % 3], first.normal_index[edge], second.normal_index[d_corner]]
+
+    return ([b, c, a, d], normals, [(edge + 1) % 3, (edge + 2) % 3, edge], d_corner)
+
+# Returns the index of a FaceType for the merged quad, or None when the triangles cannot share one.
+def getMergedFaceType(model : COBJBuilder.Model, first : COBJBuilder.Primitive, second : COBJBuilder.Primitive, first_corners : list, d_corner : int):
+    first_type = model.getFaceType(first.face_type_index)
+
+    if not first_type.hasTexCoords():
+        # Without texture coordinates one face type looks the same on any shape.
+        if first.face_type_index == second.face_type_index:
+            return first.face_type_index
+        return None
+
+    second_type = model.getFaceType(second.face_type_index)
+
+    if not second_type.hasTexCoords() or first_type.hasTexCoordAnimation() or second_type.hasTexCoordAnimation():
+        return None
+
+    if first_type.getBMPID() != second_type.getBMPID() or first_type.opcodes != second_type.opcodes:
+        return None
+
+    first_uvs = first_type.texCoordFrames[0]
+    second_uvs = second_type.texCoordFrames[0]
+
+    b, c, a = first_corners
+    second_b = (d_corner + 1) % 3
+    second_a = (d_corner + 2) % 3
+
+    # The texture has to meet without a seam along the shared edge.
+    if first_uvs[a] != second_uvs[second_a] or first_uvs[b] != second_uvs[second_b]:
+        return None
+
+    face_type = COBJBuilder.FaceType()
+    face_type.opcodes = list(first_type.opcodes)
+    face_type.setTexCoords(True, (first_uvs[b], first_uvs[c], first_uvs[a], second_uvs[d_corner]))
+    face_type.setBMPID(first_type.getBMPID())
+
+    return model.internFaceType(face_type)
+
+# max_angle is how many degrees the planes of two triangles may differ and still become a quad.
+def mergeTriangles(model : COBJBuilder.Model, report : OptimizeReport, max_angle : float = 1.0):
+    frames = getFrames(model)
+    minimum_cosine = math.cos(math.radians(max_angle))
+
+    edges = {}
+
+    for index, primitive in enumerate(model.primitives):
+        if primitive.getPolygonType() == TRIANGLE:
+            for corner in range(0, 3):
+                edge = (primitive.vertex_index[corner], primitive.vertex_index[(corner + 1) % 3])
+                edges.setdefault((min(edge), max(edge)), []).append(index)
+
+    merged = [None] * len(model.primitives)
+    consumed = [False] * len(model.primitives)
+
+    for index, first in enumerate(model.primitives):
+        if first.getPolygonType() != TRIANGLE or consumed[index]:
+            continue
+
+        for edge in range(0, 3):
+            a = first.vertex_index[edge]
+            b = first.vertex_index[(edge + 1) % 3]
+            partner = None
+
+            for other in edges[(min(a, b), max(a, b))]:
+                if other == index or consumed[other]:
+                    continue
+
+                second = model.primitives[other]
+
+                if (first.texture, first.bitfield, first.reflective) != (second.texture, second.bitfield, second.reflective):
+                    continue
+
+                corners = getMergedCorners(first, second, edge, frames, minimum_cosine)
+
+                if corners is None:
+                    continue
+
+                face_type_index = getMergedFaceType(model, first, second, corners[2], corners[3])
+
+                if face_type_index is None:
+                    continue
+
+                partner = (other, corners, face_type_index)
+                break
+
+            if partner is None:
+                continue
+
+            other, corners, face_type_index = partner
+
+            quad = COBJBuilder.Primitive()
+            quad.setTypeQuad(corners[0], corners[1])
+            quad.setMaterialBitfield(first.bitfield)
+            quad.setFaceTypeIndex(face_type_index)
+            quad.setTexture(first.texture)
+            quad.setReflective(first.reflective)
+
+            merged[index] = quad
+            consumed[index] = True
+            consumed[other] = True
+            report.merged += 1
+            break
+
+    # The quad takes the place of the first triangle and the second one is dropped.
+    primitives = []
+
+    for index, primitive in enumerate(model.primitives):
+        if merged[index] is not None:
+            primitives.append(merged[index])
+        elif not consumed[index]:
+            primitives.append(primitive)
+
+    model.primitives = primitives
+
+def getUsedFaceTypes(model : COBJBuilder.Model):
+    return set(p.face_type_index for p in model.primitives if p.getPolygonType() != COBJBuilder.PrimitivePolygonType.STAR)
+
+# Merged textured quads get face types of their own, which can leave the ones of the triangles unused.
+# Only the face types at in_use_before that no primitive uses any more are removed. Face types nothing used
+# before stay, so the ones a caller keeps for later are not lost.
+def removeUnusedFaceTypes(model : COBJBuilder.Model, in_use_before : set):
+    orphaned = in_use_before - getUsedFaceTypes(model)
+
+    if len(orphaned) == 0:
+        return
+
+    kept = [i for i in range(0, len(model.face_types)) if i not in orphaned]
+    new_indexes = {old: new for new, old in enumerate(kept)}
+
+    model.face_types = [model.face_types[i] for i in kept]
+    model.face_type_lookup = None
+
+    for primitive in model.primitives:
+        if primitive.getPolygonType() != COBJBuilder.PrimitivePolygonType.STAR:
+            primitive.face_type_index = new_indexes[primitive.face_type_index]
+
+# Optimizes the primitives of model in place and returns an OptimizeReport.
+def optimizeModel(model : COBJBuilder.Model, merge_quads : bool = True, max_angle : float = 1.0):
+    report = OptimizeReport()
+    report.before = model.getPrimitiveAmount()
+
+    with Profiling.span("optimize.cleanup"):
+        removeDegenerateAndDuplicates(model, report)
+
+    if merge_quads:
+        with Profiling.span("optimize.mergeQuads"):
+            in_use_before = getUsedFaceTypes(model)
+            mergeTriangles(model, report, max_angle)
+            removeUnusedFaceTypes(model, in_use_before)
+
+    report.after = model.getPrimitiveAmount()
+
+    return report
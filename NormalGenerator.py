@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import math
+
+import COBJBuilder
+import MeshImporter
+import Profiling
+
+# Replaces the normal buffers of a Model with normals made from its triangles and quads.
+# Every frame is worked on as whole columns of corner positions, so a morph animation costs a few list passes
+# per frame instead of a call per corner. A normal index points at the same normal in every frame, so two
+# normals only share an index when they are equal in all frames.
+
+TRIANGLE = COBJBuilder.PrimitivePolygonType.TRIANGLE
+QUAD = COBJBuilder.PrimitivePolygonType.QUAD
+
+def getCorners(primitive : COBJBuilder.Primitive):
+    if primitive.getPolygonType() == TRIANGLE:
+        return 3
+    return 4
+
+# Returns the normal of every face in frame, not normalized so that bigger faces weigh more when smoothing.
+# A triangle uses the cross product of two edges, a quad the one of its diagonals, which also works for quads that are not flat.
+def getFaceNormals(frame : list, first : list, second : list, third : list, fourth : list):
+    a = [frame[i] for i in first]
+    b = [frame[i] for i in second]
+    c = [frame[i] for i in third]
+    d = [frame[i] for i in fourth]
+
+    u = [(pc[0] - pa[0], pc[1] - pa[1], pc[2] - pa[2]) for pa, pc in zip(a, c)]
+    v = [(pd[0] - pb[0], pd[1] - pb[1], pd[2] - pb[2]) for pb, pd in zip(b, d)]
+
+    return [(x[1] * y[2] - x[2] * y[1], x[2] * y[0] - x[0] * y[2], x[0] * y[1] - x[1] * y[0]) for x, y in zip(u, v)]
+
+# Turns summed normals into 4DNL values of length MeshImporter.NORMAL_ONE, a zero normal points along x.
+def toFixedNormals(normals : list):
+    lengths = [math.sqrt(n[0] * n[0] + n[1] * n[1] + n[2] * n[2]) for n in normals]
+    scales = [MeshImporter.NORMAL_ONE / length if length != 0.0 else 0.0 for length in lengths]
+
+    return [(round(n[0] * s), round(n[1] * s), round(n[2] * s)) if s != 0.0 else (MeshImporter.NORMAL_ONE, 0, 0) for n, s in zip(normals, scales)]
+
+# Sums the normal of every face into each of its corners.
+def getVertexNormals(face_normals : list, corner_faces : list, vertex_amount : int):
+    sums = [[0, 0, 0] for i in range(0, vertex_amount)]
+
+    for vertex, face in corner_faces:
+        total = sums[vertex]
+        normal = face_normals[face]
+        total[0] += normal[0]
+        total[1] += normal[1]
+        total[2] += normal[2]
+
+    return sums
+
+# smooth shares one normal between all faces at a vertex, otherwise every face gets a normal of its own.
+# Returns how many normals the model has afterwards.
+def generateNormals(model : COBJBuilder.Model, smooth : bool = True):
+    faces = [p for p in model.primitives if p.getPolygonType() == TRIANGLE or p.getPolygonType() == QUAD]
+
+    # A triangle repeats its last corner, which makes its diagonals two of its edges.
+    first = [p.vertex_index[0] for p in faces]
+    second = [p.vertex_index[1] for p in faces]
+    third = [p.vertex_index[2] for p in faces]
+    fourth = [p.vertex_index[3] if getCorners(p) == 4 else p.vertex_index[0] for p in faces]
+
+    corner_faces = [(p.vertex_index[c], f) for f, p in enumerate(faces) for c in range(0, getCorners(p))]
+
+    # Frames that share a position buffer get the same normals, so every position buffer is worked on once.
+    vertex_ids = {}
+    normal_columns = []
+
+    with Profiling.span("normals.compute"):
+        for buffer_id_frame in model.buffer_id_frames:
+            vertex_id = buffer_id_frame.getVertexBufferID()
+
+            if vertex_id in vertex_ids:
+                continue
+
+            frame = model.vertex_buffer_ids[vertex_id].vector
+            face_normals = getFaceNormals(frame, first, second, third, fourth)
+
+            if smooth:
+                normal_columns.append(toFixedNormals(getVertexNormals(face_normals, corner_faces, len(frame))))
+            else:
+                normal_columns.append(toFixedNormals(face_normals))
+
+            vertex_ids[vertex_id] = len(vertex_ids) + 1
+
+    with Profiling.span("normals.assign"):
+        # A row holds one normal in every frame, equal rows become one normal index.
+        rows = list(zip(*normal_columns))
+        row_indexes = {}
+        unique_rows = []
+
+        def getNormalIndex(row : int):
+            key = rows[row]
+
+            if key not in row_indexes:
+                row_indexes[key] = len(unique_rows)
+                unique_rows.append(key)
+
+            return row_indexes[key]
+
+        if smooth:
+            face_normal_indexes = [[getNormalIndex(i) for i in p.vertex_index[:getCorners(p)]] for p in faces]
+        else:
+            face_normal_indexes = [getCorners(p) * [getNormalIndex(f)] for f, p in enumerate(faces)]
+
+        if len(unique_rows) > MeshImporter.INDEX_LIMIT:
+            raise Exception("The model needs {} normals but a primitive can only index {}".format(len(unique_rows), MeshImporter.INDEX_LIMIT))
+
+        for p, normal_indexes in zip(faces, face_normal_indexes):
+            p.normal_index[:len(normal_indexes)] = normal_indexes
+
+        # Billboards and lines point at normal 0, so there is always one.
+        if len(unique_rows) == 0:
+            unique_rows.append(len(vertex_ids) * ((MeshImporter.NORMAL_ONE, 0, 0),))
+
+        normal_buffer_ids = {}
+
+        for column in range(0, len(vertex_ids)):
+            normal_buffer_ids[column + 1] = COBJBuilder.Vector3DArray(len(unique_rows))
+            normal_buffer_ids[column + 1].setValues([row[column] for row in unique_rows])
+
+        for buffer_id_frame in model.buffer_id_frames:
+            buffer_id_frame.setNormalBufferID(vertex_ids[buffer_id_frame.getVertexBufferID()])
+
+        model.normal_buffer_ids = normal_buffer_ids
+
+    return len(unique_rows)
@@ -1,7 +1,11 @@
-from PIL import Image # 9.4.0-2
 import struct
+import json
 from enum import Enum
 
+import FileOutput
+import Profiling
+
+GLYPH_STRUCT = struct.Struct( ">BBBBBBBBBbb" )
 
 class Font:
     def __init__(self, width = 0, height = 0, left = 0, top = 0, x_advance = 0, offset_x = 0, offset_y = 0):
@@ -19,7 +23,110 @@ class Font:
         print( ', '.join("%s: %s" % item for item in attrs.items()) )
 
     def writeFont( self, code ):
-        return struct.pack( ">BBBBBBBBBbb", code, 0, self.width, self.height, self.left, 0, self.top, 0, self.x_advance, self.offset_x, self.offset_y )
+        return GLYPH_STRUCT.pack( code, 0, self.width, self.height, self.left, 0, self.top, 0, self.x_advance, self.offset_x, self.offset_y )
+
+    def writeFontInto( self, buffer, offset, code ):
+        GLYPH_STRUCT.pack_into( buffer, offset, code, 0, self.width, self.height, self.left, 0, self.top, 0, self.x_advance, self.offset_x, self.offset_y )
+
+# Glyphs are stored in a slot per character code, so they always come out in code order.
+class FontTable:
+    def __init__(self):
+        self.glyphs = [None] * 0x100
+        self.glyph_amount = 0
+        self.packed = None
+
+    def fromDictionary( font_dictionary : {} ):
+        table = FontTable()
+
+        for key in font_dictionary:
+            table.addGlyph( key, font_dictionary[ key ] )
+
+        return table
+
+    def toCode( code ):
+        if isinstance( code, str ) and len( code ) == 1:
+            code = ord( code )
+
+        if not isinstance( code, int ) or code < 0 or code > 0xFF:
+            raise Exception( "Glyph code {} is not a character code from 0 to 255".format( repr( code ) ) )
+
+        return code
+
+    def addGlyph( self, code, font : Font ):
+        code = FontTable.toCode( code )
+
+        if self.glyphs[ code ] is not None:
+            raise Exception( "Glyph code {} is already in the table".format( code ) )
+
+        self.glyphs[ code ] = font
+        self.glyph_amount += 1
+        self.packed = None
+
+    def removeGlyph( self, code ):
+        code = FontTable.toCode( code )
+
+        if self.glyphs[ code ] is None:
+            return False
+
+        self.glyphs[ code ] = None
+        self.glyph_amount -= 1
+        self.packed = None
+        return True
+
+    def getGlyph( self, code ):
+        return self.glyphs[ FontTable.toCode( code ) ]
+
+    def hasGlyph( self, code ):
+        return self.getGlyph( code ) is not None
+
+    def getGlyphAmount( self ):
+        return self.glyph_amount
+
+    def __len__( self ):
+        return self.glyph_amount
+
+    # The packed table is kept until a glyph is added or removed. Call invalidate after editing a Font in place.
+    def invalidate( self ):
+        self.packed = None
+
+    def pack( self ):
+        if self.packed is not None:
+            return self.packed
+
+        size = GLYPH_STRUCT.size * self.glyph_amount
+
+        if (size & 0xF) != 0:
+            size = (size - (size & 0xF)) + 0x10
+
+        font_data = bytearray( b'\xAD' * size )
+        offset = 0
+
+        for code in range( 0, 0x100 ):
+            if self.glyphs[ code ] is not None:
+                self.glyphs[ code ].writeFontInto( font_data, offset, code )
+                offset += GLYPH_STRUCT.size
+
+        self.packed = bytes( font_data )
+
+        return self.packed
+
+# The JSON object maps a glyph to the arguments of Font. A key of one character is the character
+# itself and a longer key is the code, so "A", "65" and "065" are the same glyph.
+def loadFontJSON( path : str ):
+    with open( path, "r" ) as json_file:
+        glyphs = json.load( json_file )
+
+    table = FontTable()
+
+    for key in glyphs:
+        code = key
+
+        if len( key ) != 1:
+            code = int( key )
+
+        table.addGlyph( code, Font( **glyphs[ key ] ) )
+
+    return table
 
 def makeHeader( endian, number_of_glyphs, platform_number, unk_number, img_width, img_height ):
     START_HEADER_SIZE = 0x20
@@ -36,15 +143,10 @@ def makeHeader( endian, number_of_glyphs, platform_number, unk_number, img_width
     return struct.pack( "{}IIHHIHBBIII".format( endian ), 0x50544E46, font_size, 100, number_of_glyphs, platform_number, 0, unk_number, 0, START_HEADER_SIZE, 0, offset_to_image_header )
 
 def makeFontData( font_dictionary ):
-    font_data = bytearray()
-
-    for key in font_dictionary:
-        font_data += font_dictionary[ key ].writeFont( key )
+    if not isinstance( font_dictionary, FontTable ):
+        font_dictionary = FontTable.fromDictionary( font_dictionary )
 
-    while (len(font_data) & 0xF) != 0:
-        font_data.append( 0xAD )
-
-    return font_data
+    return font_dictionary.pack()
 
 def makeImageHeader( endian, img_width, img_height ):
     IMAGE_HEADER_SIZE = 0x10
@@ -79,17 +181,7 @@ class Platform( Enum ):
     Windows = 1
     Macintosh = 2
 
-def writeFNTFile( reference_image_path : str, output_fnt_path : str, font : {}, kind : Platform ):
-    colorful_image = Image.open( reference_image_path )
-
-    if colorful_image.width != 256:
-        print( "This format does not support a width of ", colorful_image.width )
-        print( "The width has to be ", 256 )
-        exit()
-
-    # There is only one color channel.
-    img = colorful_image.getchannel( 0 )
-
+def getPlatformSettings( kind : Platform ):
     status_endian = '@'
     version_number = 8
 
@@ -101,11 +193,72 @@ def writeFNTFile( reference_image_path : str, output_fnt_path : str, font : {},
     else:
         status_endian = '>'
 
-    data = bytearray( makeHeader( endian = status_endian, number_of_glyphs = len( font ), platform_number = version_number, unk_number = 10, img_width = colorful_image.width, img_height = colorful_image.height  ) )
+    return (status_endian, version_number)
+
+# The glyph records are always big endian and the atlas is one nibble per pixel,
+# so only the header and the image header differ between the platforms.
+class FontEncoding:
+    def __init__(self, font_data, image_data, number_of_glyphs, img_width, img_height):
+        self.font_data = font_data
+        self.image_data = image_data
+        self.number_of_glyphs = number_of_glyphs
+        self.img_width = img_width
+        self.img_height = img_height
+
+    def make( self, kind : Platform ):
+        status_endian, version_number = getPlatformSettings( kind )
+
+        data = bytearray( makeHeader( endian = status_endian, number_of_glyphs = self.number_of_glyphs, platform_number = version_number, unk_number = 10, img_width = self.img_width, img_height = self.img_height ) )
+
+        data += self.font_data
+        data += makeImageHeader( status_endian, self.img_width, self.img_height )
+        data += self.image_data
+
+        return data
+
+# font is either a FontTable or a dictionary of character codes to Font.
+def encodeFont( reference_image_path : str, font : {} ):
+    from PIL import Image # 9.4.0-2
+
+    if not isinstance( font, FontTable ):
+        font = FontTable.fromDictionary( font )
+
+    with Profiling.span( "pfnt.decode" ):
+        colorful_image = Image.open( reference_image_path )
+        colorful_image.load()
+
+    if colorful_image.width != 256:
+        raise Exception( "This format does not support a width of {}. The width has to be {}".format( colorful_image.width, 256 ) )
+
+    # There is only one color channel.
+    img = colorful_image.getchannel( 0 )
+
+    font_data = Profiling.measure( "pfnt.makeFontData", makeFontData, font )
+    image_data = Profiling.measure( "pfnt.makeImageData", makeImageData, img )
+
+    return FontEncoding( font_data, image_data, len( font ), img.width, img.height )
+
+def writeFNTFile( reference_image_path : str, output_fnt_path : str, font : {}, kind : Platform ):
+    data = encodeFont( reference_image_path, font ).make( kind )
+
+    with Profiling.span( "pfnt.write" ) as span:
+        FileOutput.writeFileAtomic( output_fnt_path, data )
+        span.addBytes( len( data ) )
+
+# output_fnt_paths maps each Platform to the path it gets written to.
+def writeFNTFiles( reference_image_path : str, output_fnt_paths : {}, font : {} ):
+    encoding = encodeFont( reference_image_path, font )
+
+    for kind in output_fnt_paths:
+        data = encoding.make( kind )
+
+        with Profiling.span( "pfnt.write" ) as span:
+            FileOutput.writeFileAtomic( output_fnt_paths[ kind ], data )
+            span.addBytes( len( data ) )
 
-    data += makeFontData( font )
-    data += makeImageHeader( status_endian, img.width, img.height )
-    data += makeImageData( img )
+# Every job is a (reference_image_path, output_fnt_paths, font) tuple for writeFNTFiles.
+def writeFNTFileBatch( jobs : [], processes : int = None ):
+    import multiprocessing
 
-    new_file = open( output_fnt_path, "wb" )
-    new_file.write( data )
+    with multiprocessing.Pool( processes ) as pool:
+        pool.starmap( writeFNTFiles, jobs )
@@ -0,0 +1,89 @@
+import struct
+
+import PFNTBuilder
+import Profiling
+
+# Reads PFNT resources made by PFNTBuilder back into a FontTable and an atlas image.
+# The glyph records are unpacked in one pass with GLYPH_STRUCT and the 4 bit atlas goes through Pillow's L;4 decoder.
+
+PFNT_TAG = 0x50544E46
+HEADER_FORMAT = "IIHHIHBBIII"
+IMAGE_HEADER_FORMAT = "BBBBHHIHH"
+IMAGE_HEADER_SIZE = 0x10
+
+class PFNTResource:
+    def __init__(self, platform : PFNTBuilder.Platform, font : PFNTBuilder.FontTable, image_data : bytes, img_width : int, img_height : int):
+        self.platform = platform
+        self.font = font
+        self.image_data = image_data
+        self.img_width = img_width
+        self.img_height = img_height
+
+    def getPlatform( self ):
+        return self.platform
+
+    def getFontTable( self ):
+        return self.font
+
+    # Returns the atlas as an L image, set pixels are 255 and clear ones 0.
+    def getImage( self ):
+        from PIL import Image # 9.4.0-2
+
+        with Profiling.span( "pfnt.readImage" ):
+            return Image.frombytes( "L", (self.img_width, self.img_height), self.image_data, "raw", "L;4" )
+
+    # Returns a FontEncoding that writes the glyphs as they are now, so an edit does not need the source art.
+    def makeFontEncoding( self ):
+        return PFNTBuilder.FontEncoding( self.font.pack(), self.image_data, len( self.font ), self.img_width, self.img_height )
+
+# The header tag is "FNTP" in little endian PC and PlayStation files and "PTNF" in big endian Macintosh files.
+def getEndian( data ):
+    if bytes( data[0:4] ) == struct.pack( "<I", PFNT_TAG ):
+        return '<'
+    if bytes( data[0:4] ) == struct.pack( ">I", PFNT_TAG ):
+        return '>'
+
+    raise Exception( "Not a PFNT resource, it starts with {}".format( bytes( data[0:4] ) ) )
+
+def readPFNTResource( data ):
+    endian = getEndian( data )
+
+    header = struct.unpack_from( endian + HEADER_FORMAT, data, 0 )
+    number_of_glyphs = header[3]
+    platform_number = header[4]
+    glyph_offset = header[8]
+    image_header_offset = header[10]
+
+    if platform_number == 9:
+        platform = PFNTBuilder.Platform.Playstation
+    elif endian == '<':
+        platform = PFNTBuilder.Platform.Windows
+    else:
+        platform = PFNTBuilder.Platform.Macintosh
+
+    glyph_end = glyph_offset + PFNTBuilder.GLYPH_STRUCT.size * number_of_glyphs
+
+    if glyph_end > image_header_offset:
+        raise Exception( "{} glyphs do not fit before the image header at {}".format( number_of_glyphs, image_header_offset ) )
+
+    font = PFNTBuilder.FontTable()
+
+    # Glyph records are big endian on every platform.
+    for code, _, width, height, left, _, top, _, x_advance, offset_x, offset_y in PFNTBuilder.GLYPH_STRUCT.iter_unpack( data[ glyph_offset:glyph_end ] ):
+        font.addGlyph( code, PFNTBuilder.Font( width, height, left, top, x_advance, offset_x, offset_y ) )
+
+    image_header = struct.unpack_from( endian + IMAGE_HEADER_FORMAT, data, image_header_offset )
+    img_width = image_header[4]
+    img_height = image_header[5]
+
+    image_offset = image_header_offset + IMAGE_HEADER_SIZE
+    image_data = bytes( data[ image_offset:image_offset + int( img_width / 2 ) * img_height ] )
+
+    if len( image_data ) != int( img_width / 2 ) * img_height:
+        raise Exception( "The {}x{} atlas needs {} bytes but only {} are left".format( img_width, img_height, int( img_width / 2 ) * img_height, len( image_data ) ) )
+
+    return PFNTResource( platform, font, image_data, img_width, img_height )
+
+def readPFNTFile( fnt_path : str ):
+    with open( fnt_path, "rb" ) as fnt_file:
+        return readPFNTResource( fnt_file.read() )
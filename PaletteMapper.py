@@ -0,0 +1,157 @@
+# Maps colors to the nearest entry of a fixed palette through a 32x32x32 cube that covers every RGB555 color.
+# The cube is filled once per palette, after that mapping an image is one lookup per pixel inside Pillow.
+# Every platform stores colors as RGB555, so two colors that fall into the same cell could never be told apart anyway.
+
+# The same 5 bit value addColor would store for an 8 bit channel.
+CHANNEL_TO_5_BIT = bytes( min( int( (v / 255.0) * 32.0 ), 31 ) for v in range( 0, 0x100 ) )
+
+# Place the 5 bit channels of a cube key (r << 10) | (g << 5) | b in the low and high byte of a 16 bit word.
+GREEN_TO_LOW  = bytes( ((v & 7) << 5) & 0xFF for v in range( 0, 0x100 ) )
+GREEN_TO_HIGH = bytes( (v >> 3) & 3 for v in range( 0, 0x100 ) )
+RED_TO_HIGH   = bytes( (v << 2) & 0xFF for v in range( 0, 0x100 ) )
+
+def mergeBytes( a : bytes, b : bytes ):
+    # Bitwise or of two byte strings, one big integer operation instead of a loop over the bytes.
+    return (int.from_bytes( a, "big" ) | int.from_bytes( b, "big" )).to_bytes( len( a ), "big" )
+
+# 4x4 Bayer matrix for ordered dithering.
+BAYER_4X4 = ( ( 0,  8,  2, 10),
+              (12,  4, 14,  6),
+              ( 3, 11,  1,  9),
+              (15,  7, 13,  5) )
+
+def makeDitherTables():
+    # One 8 to 5 bit table per Bayer cell, each shifted by up to half a 5 bit step either way.
+    tables = []
+
+    for row in BAYER_4X4:
+        row_tables = []
+
+        for threshold in row:
+            bias = (threshold + 0.5) / 16.0 * 8.0 - 4.0
+
+            row_tables.append( bytes( CHANNEL_TO_5_BIT[ min( max( int( v + bias ), 0 ), 255 ) ] for v in range( 0, 0x100 ) ) )
+
+        tables.append( row_tables )
+
+    return tables
+
+DITHER_TABLES = None
+
+def expandChannel( value : int ):
+    # The middle of the 8 bit range that addColor turns back into value.
+    return (value << 3) | 4
+
+class PaletteMapper:
+    # palette is a flat [r, g, b, r, g, b, ...] list of 8 bit channels like Image.getpalette() returns.
+    def __init__(self, palette : []):
+        if len( palette ) < 3 or len( palette ) > 0x300:
+            raise Exception( "The palette has {} channels, it needs 1 to 256 colors".format( len( palette ) ) )
+
+        self.palette = list( palette[ :len( palette ) - len( palette ) % 3 ] )
+        self.color_amount = len( self.palette ) // 3
+        self.cube = None
+        self.key_table = None
+
+    def fromImage( palette_image, color_amount : int = None ):
+        palette = palette_image.getpalette()
+
+        if color_amount is not None:
+            palette = palette[ :color_amount * 3 ]
+
+        return PaletteMapper( palette )
+
+    def makePaletteImage(self):
+        from PIL import Image # 9.4.0-2
+
+        # Pillow can pad a palette to 256 entries with black. Padding with the first color instead makes sure
+        # an extra entry is never closer than a real one, so every index stays below color_amount.
+        palette = self.palette + self.palette[ :3 ] * (0x100 - self.color_amount)
+
+        palette_image = Image.new( "P", (1, 1) )
+        palette_image.putpalette( palette )
+
+        return palette_image
+
+    def getCube(self):
+        from PIL import Image # 9.4.0-2
+
+        if self.cube is not None:
+            return self.cube
+
+        # Every RGB555 color as one pixel, in the order of its (r << 10) | (g << 5) | b key.
+        colors = bytearray( 0x8000 * 3 )
+        channel = bytes( expandChannel( v ) for v in range( 0, 32 ) )
+
+        colors[ 0::3 ] = bytes( channel[ key >> 10 ] for key in range( 0, 0x8000 ) )
+        colors[ 1::3 ] = bytes( channel[ (key >> 5) & 31 ] for key in range( 0, 0x8000 ) )
+        colors[ 2::3 ] = bytes( channel[ key & 31 ] for key in range( 0, 0x8000 ) )
+
+        color_image = Image.frombytes( "RGB", (0x100, 0x80), bytes( colors ) )
+
+        self.cube = color_image.quantize( palette = self.makePaletteImage(), dither = Image.Dither.NONE ).tobytes()
+
+        return self.cube
+
+    # The cube padded to the 65536 entries Image.point takes to turn an "I" image into an "L" one.
+    def getKeyTable(self):
+        if self.key_table is None:
+            self.key_table = list( self.getCube() ) + [0] * 0x8000
+
+        return self.key_table
+
+    def getIndex(self, color : tuple):
+        return self.getCube()[ (CHANNEL_TO_5_BIT[ color[0] ] << 10) | (CHANNEL_TO_5_BIT[ color[1] ] << 5) | CHANNEL_TO_5_BIT[ color[2] ] ]
+
+    # Same as getIndex for a color that is already 5 bits per channel.
+    def getIndex5Bit(self, color : tuple):
+        return self.getCube()[ (color[0] << 10) | (color[1] << 5) | color[2] ]
+
+    # Returns the palette index of every pixel of image as bytes, row by row.
+    def mapImage(self, image, dither : bool = False):
+        global DITHER_TABLES
+
+        from PIL import Image # 9.4.0-2
+
+        rgb = image.convert( "RGB" ).tobytes()
+
+        if not dither:
+            red   = rgb[ 0::3 ].translate( CHANNEL_TO_5_BIT )
+            green = rgb[ 1::3 ].translate( CHANNEL_TO_5_BIT )
+            blue  = rgb[ 2::3 ].translate( CHANNEL_TO_5_BIT )
+        else:
+            if DITHER_TABLES is None:
+                DITHER_TABLES = makeDitherTables()
+
+            channels = [ bytearray( image.width * image.height ) for c in range( 0, 3 ) ]
+
+            for y in range( 0, image.height ):
+                start = y * image.width
+                row = rgb[ start * 3:(start + image.width) * 3 ]
+                row_tables = DITHER_TABLES[ y & 3 ]
+
+                for c in range( 0, 3 ):
+                    row_channel = row[ c::3 ]
+
+                    for x in range( 0, min( 4, image.width ) ):
+                        channels[c][ start + x:start + image.width:4 ] = row_channel[ x::4 ].translate( row_tables[x] )
+
+            red, green, blue = channels
+
+        # The key of every pixel as a little endian 16 bit word, looked up in the cube by Image.point.
+        words = bytearray( 2 * len( red ) )
+        words[ 0::2 ] = mergeBytes( bytes( green ).translate( GREEN_TO_LOW ), bytes( blue ) )
+        words[ 1::2 ] = mergeBytes( bytes( red ).translate( RED_TO_HIGH ), bytes( green ).translate( GREEN_TO_HIGH ) )
+
+        keys = Image.frombytes( "I", image.size, bytes( words ), "raw", "I;16" )
+
+        return keys.point( self.getKeyTable(), "L" ).tobytes()
+
+    # Returns a "P" image with this palette, usable anywhere the builders take a quantized image.
+    def mapToImage(self, image, dither : bool = False):
+        from PIL import Image # 9.4.0-2
+
+        mapped = Image.frombytes( "P", image.size, self.mapImage( image, dither ) )
+        mapped.putpalette( self.palette )
+
+        return mapped
@@ -0,0 +1,125 @@
+import json
+import time
+
+# Optional timing of the builder stages.
+# While no sink is set span() hands back a shared object that does nothing and measure() only calls
+# the function, so the builders pay one global lookup per stage when profiling is off.
+
+class RecordingSink:
+    def __init__(self):
+        self.records = []
+
+    def record(self, name : str, seconds : float, byte_count : int):
+        self.records.append( (name, seconds, byte_count) )
+
+    def clear(self):
+        self.records = []
+
+    def getStages(self):
+        stages = {}
+
+        for name, seconds, byte_count in self.records:
+            if name not in stages:
+                stages[ name ] = { "calls": 0, "seconds": 0.0, "bytes": 0 }
+
+            stage = stages[ name ]
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["bytes"] += byte_count
+
+        return stages
+
+    def summary(self):
+        stages = self.getStages()
+        total_seconds = 0.0
+
+        for name in stages:
+            total_seconds += stages[ name ]["seconds"]
+
+        lines = [ "{:28} {:>8} {:>10} {:>10} {:>12} {:>7}".format( "stage", "calls", "total s", "mean ms", "bytes", "share" ) ]
+
+        for name in sorted( stages, key = lambda name: stages[ name ]["seconds"], reverse = True ):
+            stage = stages[ name ]
+            share = 0.0
+
+            if total_seconds != 0.0:
+                share = 100.0 * stage["seconds"] / total_seconds
+
+            lines.append( "{:28} {:8} {:10.4f} {:10.3f} {:12} {:6.1f}%".format( name, stage["calls"], stage["seconds"], 1000.0 * stage["seconds"] / stage["calls"], stage["bytes"], share ) )
+
+        return "\n".join( lines )
+
+    def toJSON(self):
+        return json.dumps( { "stages": self.getStages(), "records": self.records }, indent = 4 )
+
+    def writeJSON(self, path : str):
+        with open( path, "w" ) as json_file:
+            json_file.write( self.toJSON() )
+
+class Span:
+    def __init__(self, sink, name : str):
+        self.sink = sink
+        self.name = name
+        self.byte_count = 0
+        self.start = 0.0
+
+    def addBytes(self, byte_count : int):
+        self.byte_count += byte_count
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.sink.record( self.name, time.perf_counter() - self.start, self.byte_count )
+        return False
+
+class NullSpan:
+    def addBytes(self, byte_count : int):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+NULL_SPAN = NullSpan()
+
+sink = None
+
+def getSink():
+    return sink
+
+# Returns the previous sink so it can be put back.
+def setSink(new_sink):
+    global sink
+
+    previous_sink = sink
+    sink = new_sink
+
+    return previous_sink
+
+def span(name : str):
+    if sink is None:
+        return NULL_SPAN
+
+    return Span( sink, name )
+
+# Calls function and records its time, with the length of the result as the byte count.
+def measure(name : str, function, *arguments, **keywords):
+    if sink is None:
+        return function( *arguments, **keywords )
+
+    start = time.perf_counter()
+    result = function( *arguments, **keywords )
+    seconds = time.perf_counter() - start
+
+    byte_count = 0
+
+    if isinstance( result, (bytes, bytearray) ):
+        byte_count = len( result )
+
+    sink.record( name, seconds, byte_count )
+
+    return result
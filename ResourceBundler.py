@@ -0,0 +1,192 @@
+import errno
+import os
+import struct
+
+import FileOutput
+import Profiling
+
+# Joins the outputs of the builders into one archive that starts with a table of contents.
+# Every entry starts at a multiple of the alignment. Entries already on disk are copied by the kernel with
+# copy_file_range, or sendfile where that is missing, so they never pass through Python. Entries in memory
+# are written straight from their buffers. The gaps between entries are never written, they are the zeros
+# a file gets when it is made longer.
+#
+# Header: tag "BNDL", version, entry amount and alignment as uint32.
+# Table of contents: for every entry its four character chunk id, offset and size as uint32.
+
+BUNDLE_TAG = 0x424E444C
+VERSION = 1
+HEADER_FORMAT = "IIII"
+HEADER_SIZE = 0x10
+ENTRY_FORMAT = "4sII"
+ENTRY_SIZE = 0xC
+
+# The errors that mean a kernel copy does not work between these two files, so the next way is tried.
+UNSUPPORTED_COPY_ERRORS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF)
+
+def toChunkID( chunk_id ):
+    if isinstance( chunk_id, str ):
+        chunk_id = chunk_id.encode( "ascii" )
+
+    if len( chunk_id ) != 4:
+        raise Exception( "Chunk ID {} is not four characters".format( repr( chunk_id ) ) )
+
+    return bytes( chunk_id )
+
+def align( offset : int, alignment : int ):
+    if (offset % alignment) != 0:
+        offset += alignment - (offset % alignment)
+
+    return offset
+
+def writeAt( descriptor : int, data, offset : int ):
+    view = memoryview( data ).cast( "B" )
+    written = 0
+
+    while written < len( view ):
+        if hasattr( os, "pwrite" ):
+            amount = os.pwrite( descriptor, view[ written: ], offset + written )
+        else:
+            os.lseek( descriptor, offset + written, os.SEEK_SET )
+            amount = os.write( descriptor, view[ written: ] )
+
+        written += amount
+
+# Copies size bytes from the start of source to offset in destination with the fastest way both files allow.
+def copyAt( source : int, destination : int, size : int, offset : int ):
+    copied = 0
+    ways = []
+
+    if hasattr( os, "copy_file_range" ):
+        ways.append( "copy_file_range" )
+
+    if hasattr( os, "sendfile" ):
+        ways.append( "sendfile" )
+
+    ways.append( "read" )
+
+    while copied < size:
+        way = ways[0]
+
+        try:
+            if way == "copy_file_range":
+                amount = os.copy_file_range( source, destination, size - copied, copied, offset + copied )
+            elif way == "sendfile":
+                # sendfile writes at the position of destination.
+                os.lseek( destination, offset + copied, os.SEEK_SET )
+                amount = os.sendfile( destination, source, copied, size - copied )
+            else:
+                data = os.pread( source, min( size - copied, 0x100000 ), copied )
+                writeAt( destination, data, offset + copied )
+                amount = len( data )
+        except OSError as error:
+            if way == "read" or error.errno not in UNSUPPORTED_COPY_ERRORS:
+                raise
+
+            ways.pop( 0 )
+            continue
+
+        if amount == 0:
+            raise Exception( "The source ended after {} of {} bytes".format( copied, size ) )
+
+        copied += amount
+
+class BundleEntry:
+    def __init__(self, chunk_id : bytes, data = None, path : str = None):
+        self.chunk_id = chunk_id
+        self.data = data
+        self.path = path
+
+class ResourceBundle:
+    def __init__(self, alignment : int = 16, endian : str = '<'):
+        if alignment < 1:
+            raise Exception( "The alignment has to be at least 1, not {}".format( alignment ) )
+
+        self.alignment = alignment
+        self.endian = endian
+        self.entries = []
+
+    # data is kept as a memoryview and not copied, so it must not change before write.
+    def addData( self, chunk_id, data ):
+        self.entries.append( BundleEntry( toChunkID( chunk_id ), data = memoryview( data ).cast( "B" ) ) )
+
+    # The file is opened and measured by write, so it may still be written until then.
+    def addFile( self, chunk_id, path : str ):
+        self.entries.append( BundleEntry( toChunkID( chunk_id ), path = path ) )
+
+    def getEntryAmount( self ):
+        return len( self.entries )
+
+    def write( self, output_path : str ):
+        sources = []
+
+        try:
+            sizes = []
+
+            for entry in self.entries:
+                if entry.path is None:
+                    sizes.append( len( entry.data ) )
+                else:
+                    sources.append( os.open( entry.path, os.O_RDONLY ) )
+                    sizes.append( os.fstat( sources[-1] ).st_size )
+
+            offsets = []
+            offset = align( HEADER_SIZE + ENTRY_SIZE * len( self.entries ), self.alignment )
+
+            for size in sizes:
+                offsets.append( offset )
+                offset = align( offset + size, self.alignment )
+
+            total_size = offset
+
+            header = bytearray( struct.pack( "{}{}".format( self.endian, HEADER_FORMAT ), BUNDLE_TAG, VERSION, len( self.entries ), self.alignment ) )
+
+            for entry, entry_offset, size in zip( self.entries, offsets, sizes ):
+                header += struct.pack( "{}{}".format( self.endian, ENTRY_FORMAT ), entry.chunk_id, entry_offset, size )
+
+            with Profiling.span( "bundle.write" ) as span:
+                with FileOutput.openFileAtomic( output_path ) as output_file:
+                    descriptor = output_file.fileno()
+                    source_index = 0
+
+                    writeAt( descriptor, header, 0 )
+
+                    for entry, entry_offset, size in zip( self.entries, offsets, sizes ):
+                        if entry.path is None:
+                            writeAt( descriptor, entry.data, entry_offset )
+                        else:
+                            copyAt( sources[ source_index ], descriptor, size, entry_offset )
+                            source_index += 1
+
+                    os.ftruncate( descriptor, total_size )
+
+                span.addBytes( total_size )
+        finally:
+            for source in sources:
+                os.close( source )
+
+        return total_size
+
+# Returns the table of contents of a bundle as (chunk id, offset, size) tuples.
+def readTableOfContents( data ):
+    for endian in ('<', '>'):
+        tag, version, entry_amount, alignment = struct.unpack_from( "{}{}".format( endian, HEADER_FORMAT ), data, 0 )
+
+        if tag == BUNDLE_TAG:
+            break
+    else:
+        raise Exception( "Not a bundle, it starts with {}".format( bytes( data[0:4] ) ) )
+
+    entries = []
+
+    for index in range( 0, entry_amount ):
+        chunk_id, offset, size = struct.unpack_from( "{}{}".format( endian, ENTRY_FORMAT ), data, HEADER_SIZE + ENTRY_SIZE * index )
+        entries.append( (chunk_id.decode( "ascii" ), offset, size) )
+
+    return entries
+
+# Returns every entry of a bundle as a (chunk id, memoryview) tuple without copying them.
+def readBundle( data ):
+    view = memoryview( data )
+
+    return [(chunk_id, view[ offset:offset + size ]) for chunk_id, offset, size in readTableOfContents( data )]
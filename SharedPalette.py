@@ -0,0 +1,213 @@
+import CBMPBuilder
+import FileOutput
+import PaletteMapper
+import Profiling
+
+# Lets a set of PlayStation textures share a few palettes instead of one palette per texture.
+# Every texture is reduced once to a histogram of the RGB555 colors it shows. The textures are then
+# clustered like k-means: each cluster builds one 255 color palette with a median cut over the pooled
+# histograms of its textures, and each texture moves to the palette that reproduces it with the least error.
+
+PALETTE_SIZE = 255
+
+CHANNEL_TO_5_BIT = list( PaletteMapper.CHANNEL_TO_5_BIT )
+
+expandChannel = PaletteMapper.expandChannel
+
+def expandColor( color : tuple ):
+    return (expandChannel( color[0] ), expandChannel( color[1] ), expandChannel( color[2] ))
+
+# Returns a dictionary of (r, g, b) 5 bit colors to how many visible pixels have them.
+def makeHistogram( image ):
+    from PIL import Image # 9.4.0-2
+
+    rgb = image.convert( "RGB" ).point( CHANNEL_TO_5_BIT * 3 )
+
+    if image.mode in ('RGBA', 'LA'):
+        alpha = image.getchannel( "A" ).point( lambda a: 255 if a != 0 else 0 )
+    else:
+        alpha = Image.new( "L", image.size, 255 )
+
+    histogram = {}
+
+    for count, color in Image.merge( "RGBA", rgb.split() + (alpha,) ).getcolors( image.width * image.height ):
+        if color[3] == 0:
+            continue # Clear pixels always use index 0.
+
+        key = (color[0], color[1], color[2])
+        histogram[ key ] = histogram.get( key, 0 ) + count
+
+    return histogram
+
+def medianCut( histogram : {}, color_amount : int = PALETTE_SIZE ):
+    boxes = [ list( histogram.items() ) ]
+    palette = []
+
+    while len( boxes ) != 0 and len( boxes ) + len( palette ) < color_amount:
+        # Split the box with the most pixels that still has more than one color.
+        best_index = None
+        best_weight = 0
+
+        for index in range( 0, len( boxes ) ):
+            if len( boxes[ index ] ) < 2:
+                continue
+
+            weight = sum( count for color, count in boxes[ index ] )
+
+            if weight > best_weight:
+                best_weight = weight
+                best_index = index
+
+        if best_index is None:
+            break
+
+        box = boxes.pop( best_index )
+
+        ranges = [ max( color[c] for color, count in box ) - min( color[c] for color, count in box ) for c in range( 0, 3 ) ]
+        channel = ranges.index( max( ranges ) )
+
+        box.sort( key = lambda item: item[0][ channel ] )
+
+        half = best_weight / 2
+        total = 0
+        split = 1
+
+        for split in range( 1, len( box ) ):
+            total += box[ split - 1 ][1]
+
+            if total >= half:
+                break
+
+        boxes.append( box[ :split ] )
+        boxes.append( box[ split: ] )
+
+    for box in boxes:
+        weight = sum( count for color, count in box )
+
+        if weight == 0:
+            continue
+
+        palette.append( tuple( int( round( sum( color[c] * count for color, count in box ) / weight ) ) for c in range( 0, 3 ) ) )
+
+    return palette
+
+def makeMapper( palette : [] ):
+    entries = [ expandColor( color ) for color in palette ]
+
+    if len( entries ) == 0:
+        entries.append( (0, 0, 0) )
+
+    return PaletteMapper.PaletteMapper( [ channel for color in entries for channel in color ] )
+
+class TextureColors:
+    def __init__(self, histogram : {}):
+        self.colors = list( histogram.keys() )
+        self.counts = [ histogram[ color ] for color in self.colors ]
+        self.pixel_count = sum( self.counts )
+
+        self.mean = (0.0, 0.0, 0.0)
+
+        if self.pixel_count != 0:
+            self.mean = tuple( sum( color[c] * count for color, count in zip( self.colors, self.counts ) ) / self.pixel_count for c in range( 0, 3 ) )
+
+    def getError(self, palette : [], mapper):
+        if len( self.colors ) == 0:
+            return 0
+
+        if len( palette ) == 0:
+            return float( "inf" )
+
+        # The histogram already holds 5 bit colors, so every one of them is a single lookup in the cube.
+        error = 0
+
+        for color, count in zip( self.colors, self.counts ):
+            nearest = palette[ mapper.getIndex5Bit( color ) ]
+            error += count * ((color[0] - nearest[0]) ** 2 + (color[1] - nearest[1]) ** 2 + (color[2] - nearest[2]) ** 2)
+
+        return error
+
+def distanceSquared( a : tuple, b : tuple ):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+def pickSeeds( textures : [], palette_amount : int ):
+    # Farthest point seeding on the mean colors, starting from the texture that shows the most pixels.
+    seeds = [ max( range( 0, len( textures ) ), key = lambda i: textures[i].pixel_count ) ]
+
+    while len( seeds ) < min( palette_amount, len( textures ) ):
+        seeds.append( max( range( 0, len( textures ) ), key = lambda i: min( distanceSquared( textures[i].mean, textures[s].mean ) for s in seeds ) ) )
+
+    return seeds
+
+def buildPalettes( textures : [], assignments : [] ):
+    used = sorted( set( assignments ) )
+    palettes = []
+
+    with Profiling.span( "palette.medianCut" ):
+        for cluster in used:
+            pooled = {}
+
+            for texture, assignment in zip( textures, assignments ):
+                if assignment == cluster:
+                    for color, count in zip( texture.colors, texture.counts ):
+                        pooled[ color ] = pooled.get( color, 0 ) + count
+
+            palettes.append( medianCut( pooled ) )
+
+    # Clusters that emptied out are dropped, so the assignments are renumbered to the palettes left.
+    return (palettes, [ used.index( assignment ) for assignment in assignments ])
+
+# Returns (palettes, assignments), where assignments[i] is the index into palettes for image i.
+def clusterPalettes( images : [], palette_amount : int = 4, iterations : int = 4 ):
+    with Profiling.span( "palette.histogram" ):
+        textures = [ TextureColors( makeHistogram( image ) ) for image in images ]
+
+    seeds = pickSeeds( textures, palette_amount )
+    assignments = [ min( range( 0, len( seeds ) ), key = lambda s: distanceSquared( texture.mean, textures[ seeds[s] ].mean ) ) for texture in textures ]
+
+    for iteration in range( 0, iterations ):
+        palettes, assignments = buildPalettes( textures, assignments )
+
+        with Profiling.span( "palette.assign" ):
+            mappers = [ makeMapper( palette ) for palette in palettes ]
+
+            new_assignments = [ min( range( 0, len( palettes ) ), key = lambda p: texture.getError( palettes[p], mappers[p] ) ) for texture in textures ]
+
+        if new_assignments == assignments:
+            return (palettes, assignments)
+
+        assignments = new_assignments
+
+    return buildPalettes( textures, assignments )
+
+def makeSharedPaletteResource( source_img, palette : [], mapper ):
+    endian = '<'
+
+    data = CBMPBuilder.makeHeader( endian = endian, is_playstation = True )
+
+    quant_img = Profiling.measure( "cbmp.quantize", mapper.mapToImage, source_img )
+
+    data += Profiling.measure( "cbmp.writePIX", CBMPBuilder.writePIX, endian = endian, image = source_img, quantize_image = quant_img )
+    data += Profiling.measure( "cbmp.makePSPLUT", CBMPBuilder.makePSPLUT, endian = endian, palette = [ channel for color in palette for channel in expandColor( color ) ] )
+
+    return data
+
+# Writes a PlayStation CBMP for every image, with at most palette_amount different PLUTs among them.
+# Returns the index of the palette every image was given, in the same order as source_images.
+def writeSharedPaletteCBMPFiles( source_images : [], output_paths : [], palette_amount : int = 4, iterations : int = 4 ):
+    if len( source_images ) != len( output_paths ):
+        raise Exception( "There are {} images but {} output paths".format( len( source_images ), len( output_paths ) ) )
+
+    if len( source_images ) == 0:
+        return []
+
+    palettes, assignments = clusterPalettes( source_images, palette_amount, iterations )
+    mappers = [ makeMapper( palette ) for palette in palettes ]
+
+    for source_img, output_path, assignment in zip( source_images, output_paths, assignments ):
+        data = makeSharedPaletteResource( source_img, palettes[ assignment ], mappers[ assignment ] )
+
+        with Profiling.span( "cbmp.write" ) as span:
+            FileOutput.writeFileAtomic( output_path, data )
+            span.addBytes( len( data ) )
+
+    return assignments
@@ -0,0 +1,60 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image # 9.4.0-2
+
+import ANMBuilder
+import ANMReader
+
+def makeFrame(rng : random.Random):
+    image = Image.frombytes("RGB", (64, 48), rng.randbytes(64 * 48 * 3))
+    image.putalpha(Image.frombytes("L", (64, 48), bytes(rng.choice((0, 255, 255, 255)) for i in range(0, 64 * 48))))
+
+    return image
+
+class TestReadANMResource(unittest.TestCase):
+    def test_frames_and_palette_match_the_builder(self):
+        rng = random.Random(11)
+        frames = [makeFrame(rng) for i in range(0, 3)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            palette_path = os.path.join(directory, "palette.png")
+            makeFrame(rng).convert("RGB").save(palette_path)
+
+            for index, frame in enumerate(frames):
+                frame.save(os.path.join(directory, "{:04d}.png".format(index + 1)))
+
+            quant_img = ANMBuilder.loadPalette(palette_path)
+            palette = quant_img.getpalette()
+
+            # Row order indexes as writeSingleFrame stores them, 0 for clear pixels and the palette index + 1 otherwise.
+            expected = []
+
+            for frame in frames:
+                indexes = frame.convert("RGB").quantize(palette = quant_img).tobytes()
+                alpha = frame.getchannel("A").tobytes()
+
+                expected.append(bytes(0 if alpha[i] == 0 else indexes[i] + 1 for i in range(0, len(indexes))))
+
+            for kind in ANMBuilder.Platform:
+                resource = ANMReader.readANMResource(ANMBuilder.makeANMResource(directory, palette_path, kind, len(frames), quant_img))
+
+                self.assertEqual(resource.getFrameAmount(), len(frames))
+
+                for index in range(0, len(frames)):
+                    self.assertEqual(resource.getFrameIndexes(index), expected[index])
+                    self.assertEqual(resource.getFrame(index).size, (64, 48))
+
+                # PLUT color 0 is the unseen color, palette color i is stored as PLUT color i + 1.
+                colors = resource.getPalette()
+
+                for i in range(0, 255 * 3):
+                    self.assertLessEqual(abs(colors[i + 3] - palette[i]), 8)
+
+if __name__ == "__main__":
+    unittest.main()
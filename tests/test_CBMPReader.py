@@ -0,0 +1,48 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image # 9.4.0-2
+
+import CBMPBuilder
+import CBMPReader
+
+# Clear, semi-transparent and opaque pixels. Every channel is at least 32, because writePIX stores opaque
+# pixels darker than that as one fixed color.
+def makeTexture(seed : int):
+    rng = random.Random(seed)
+
+    image = Image.frombytes("RGB", (256, 256), bytes(rng.randrange(32, 256) for i in range(0, 256 * 256 * 3)))
+    image.putalpha(Image.frombytes("L", (256, 256), bytes(rng.choice((0, 128, 255)) for i in range(0, 256 * 256))))
+
+    return image
+
+class TestReadCBMPResource(unittest.TestCase):
+    def test_pc_colors_come_back_within_one_5_bit_step(self):
+        texture = makeTexture(7)
+        source = texture.tobytes()
+
+        for kind in (CBMPBuilder.Platform.Windows, CBMPBuilder.Platform.Macintosh):
+            image = CBMPReader.readCBMPResource(CBMPBuilder.makeCBMPResource(texture, kind))
+
+            self.assertEqual(image.mode, "RGBA")
+            self.assertEqual(image.size, (256, 256))
+
+            pixels = image.tobytes()
+
+            for i in range(0, 256 * 256):
+                alpha = source[i * 4 + 3]
+
+                # Clear pixels keep no color, semi-transparent ones come back at half alpha.
+                self.assertEqual(pixels[i * 4 + 3] == 0, alpha == 0)
+                self.assertEqual(pixels[i * 4 + 3] == 255, alpha == 255)
+
+                if alpha != 0:
+                    for c in range(0, 3):
+                        self.assertLessEqual(abs(pixels[i * 4 + c] - source[i * 4 + c]), 8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import PIL
+
+import GoldenHarness
+
+class TestGoldenDigests(unittest.TestCase):
+    def test_builders_match_the_baseline_digests(self):
+        golden = GoldenHarness.loadGolden(GoldenHarness.GOLDEN_PATH)
+        mismatches = GoldenHarness.verifyGolden(golden)["builders"]
+
+        # Another Pillow can quantize differently, every other output has to stay the same regardless.
+        if PIL.__version__ != golden["pillow"]:
+            mismatches = [label for label in mismatches if not label.startswith(GoldenHarness.QUANTIZED_LABELS)]
+
+        self.assertEqual(mismatches, [])
+
+if __name__ == "__main__":
+    unittest.main()
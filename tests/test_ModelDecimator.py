@@ -0,0 +1,51 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import COBJBuilder
+import MeshImporter
+import ModelDecimator
+
+# An open grid of size by size quads, made through MeshImporter like a mesh file.
+def makeGridModel(size : int):
+    mesh = MeshImporter.Mesh()
+    mesh.addFrame([(x, y * 0.5 + (x % 3) * 0.1, 0.0) for y in range(0, size + 1) for x in range(0, size + 1)])
+
+    for y in range(0, size):
+        for x in range(0, size):
+            a = y * (size + 1) + x
+            mesh.addPolygon([a, a + 1, a + size + 2, a + size + 1], None, None, "grid")
+
+    return MeshImporter.importMesh(mesh, 32.0)
+
+class TestMakeLODChain(unittest.TestCase):
+    def test_budget_below_floor_gives_lightest_model(self):
+        models = ModelDecimator.makeLODChain(makeGridModel(15), [150, 80, 30, 5])
+
+        self.assertEqual(len(models), 4)
+
+        amounts = [model.getPrimitiveAmount() for model in models]
+
+        self.assertEqual(amounts, sorted(amounts, reverse = True))
+        self.assertGreater(amounts[-1], 5)
+
+        # A second reduce on a decimator that already reached its floor stops as well.
+        self.assertEqual(amounts[-1], amounts[-2])
+
+        for model in models:
+            model.makeResource(COBJBuilder.ModelFormat.WINDOWS)
+
+    def test_face_types_unused_before_keep_their_index(self):
+        model = makeGridModel(15)
+        spare = COBJBuilder.FaceType()
+        spare.setVertexColor(True, (1, 2, 3))
+        model.face_types.append(spare)
+
+        for lod in ModelDecimator.makeLODChain(model, [150, 80, 30]):
+            self.assertEqual(len(lod.face_types), len(model.face_types))
+            self.assertEqual(lod.getFaceType(len(model.face_types) - 1).getKey(), spare.getKey())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image # 9.4.0-2
+
+import PFNTBuilder
+import PFNTReader
+
+class TestReadPFNTResource(unittest.TestCase):
+    def test_every_platform_encodes_again_byte_for_byte(self):
+        rng = random.Random(5)
+        atlas = Image.frombytes("L", (256, 64), bytes(rng.choice((0, 255)) for i in range(0, 256 * 64)))
+        font = {code: PFNTBuilder.Font(rng.randint(4, 12), rng.randint(8, 14), rng.randint(0, 240), rng.randint(0, 48), rng.randint(4, 12), rng.randint(-2, 2), rng.randint(-2, 2)) for code in range(0x20, 0x7F)}
+
+        with tempfile.TemporaryDirectory() as directory:
+            atlas_path = os.path.join(directory, "atlas.png")
+            atlas.save(atlas_path)
+
+            encoding = PFNTBuilder.encodeFont(atlas_path, font)
+
+        for kind in PFNTBuilder.Platform:
+            data = encoding.make(kind)
+            resource = PFNTReader.readPFNTResource(data)
+
+            self.assertEqual(resource.getPlatform(), kind)
+            self.assertEqual(len(resource.getFontTable()), len(font))
+            self.assertEqual(resource.makeFontEncoding().make(kind), data)
+            self.assertEqual(resource.getImage().tobytes(), atlas.tobytes())
+
+if __name__ == "__main__":
+    unittest.main()